@@ -23,7 +23,7 @@ except ImportError:
     warnings.warn('''Cannot import Domain! Nansat will not work''')
 
 try:
-    from nansat import Nansat
+    from nansat import Nansat, get_memory_usage
 except ImportError:
     warnings.warn('''Cannot import VRT! Nansat will not work''')
 
@@ -48,6 +48,21 @@ try:
 except ImportError:
     warnings.warn('''Cannot import Numpy, Matplotlib! Nansat will not work''')
 
+try:
+    from nansat_tools import prewarm_mappers, clear_mapper_cache
+except ImportError:
+    warnings.warn('''Cannot import mapper cache! Nansat will search for mappers each time''')
+
+try:
+    from vrt import set_warp_cache, clear_warp_cache, set_spill, clear_spill
+except ImportError:
+    warnings.warn('''Cannot import warp cache! Nansat will not work''')
+
+try:
+    from warpindex import WarpIndex
+except ImportError:
+    warnings.warn('''Cannot import WarpIndex! Nansat will not work''')
+
 try:
     from mosaic import Mosaic
 except ImportError:
@@ -55,5 +70,9 @@ except ImportError:
 
 os.environ['LOG_LEVEL'] = '30'
 
-__all__ = ['Nansat',  'Nansatshape', 'Domain', 'Figure', 'Nansatmap', 'np', 'plt', 'Basemap', 'Mosaic']
+__all__ = ['Nansat',  'Nansatshape', 'Domain', 'Figure', 'Nansatmap', 'np', 'plt', 'Basemap', 'Mosaic',
+           'WarpIndex',
+           'prewarm_mappers', 'clear_mapper_cache',
+           'set_warp_cache', 'clear_warp_cache', 'set_spill', 'clear_spill',
+           'get_memory_usage']
 
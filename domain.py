@@ -412,14 +412,28 @@ class Domain():
         kmlFile.write('</kml>')
         kmlFile.close()
 
-    def get_geolocation_grids(self):
+    def get_geolocation_grids(self, dataType=None, tolerance=None,
+                              chunkSize=None):
         '''Get longitude and latitude grids representing the full data grid
 
         If GEOLOCATION is not present in the self.vrt.dataset then grids
         are generated by converting pixel/line of each pixel into lat/lon
+        (see iterate_geolocation_grids() for details).
         If GEOLOCATION is present in the self.vrt.dataset then grids are read
         from the geolocation bands.
 
+        Parameters
+        -----------
+        dataType : str or numpy dtype or None
+            data type of the output grids ('float32' or 'float64').
+            If None, grids read from GEOLOCATION bands keep their native
+            data type and computed grids are 'float32'
+        tolerance : float or None
+            maximum error (degrees) of interpolation from a sparse grid for
+            domains with GCPs. If None, all pixels are transformed exactly
+        chunkSize : int or None
+            number of lines transformed at once
+
         Returns
         --------
         longitude : numpy array
@@ -432,22 +446,255 @@ class Domain():
         if len(self.vrt.geolocationArray.d) > 0:
             longitude = self.vrt.geolocationArray.xVRT.dataset.ReadAsArray()
             latitude = self.vrt.geolocationArray.yVRT.dataset.ReadAsArray()
-        else:
-            # create empty grids
-            longitude = np.zeros([self.vrt.dataset.RasterYSize,
-                                  self.vrt.dataset.RasterXSize], 'float32')
-            latitude = np.zeros([self.vrt.dataset.RasterYSize,
-                                 self.vrt.dataset.RasterXSize], 'float32')
-            # fill row-wise
-            for i in range(self.vrt.dataset.RasterXSize):
-                [lo, la] = self._transform_points(
-                           [i] * self.vrt.dataset.RasterYSize,
-                           range(self.vrt.dataset.RasterYSize))
-                longitude[:, i] = lo
-                latitude[:, i] = la
+            if dataType is not None and longitude.dtype != dataType:
+                longitude = longitude.astype(dataType)
+            if dataType is not None and latitude.dtype != dataType:
+                latitude = latitude.astype(dataType)
+            return longitude, latitude
+
+        if dataType is None:
+            dataType = 'float32'
+        # create empty grids
+        longitude = np.zeros([self.vrt.dataset.RasterYSize,
+                              self.vrt.dataset.RasterXSize], dataType)
+        latitude = np.zeros([self.vrt.dataset.RasterYSize,
+                             self.vrt.dataset.RasterXSize], dataType)
+        # fill chunk by chunk
+        for yOff, lon, lat in self.iterate_geolocation_grids(dataType,
+                                                             tolerance,
+                                                             chunkSize):
+            longitude[yOff:yOff + lon.shape[0]] = lon
+            latitude[yOff:yOff + lat.shape[0]] = lat
 
         return longitude, latitude
 
+    def iterate_geolocation_grids(self, dataType=None, tolerance=None,
+                                  chunkSize=None):
+        '''Yield longitude and latitude grids chunk by chunk (lines)
+
+        Three methods are used depending on the geo-reference:
+        GEOLOCATION arrays are read from the geolocation bands;
+        projected (GeoTransform) domains are computed analytically from the
+        GeoTransform and osr batch transformation into lat/lon;
+        for domains with GCPs each pixel is transformed with GDAL or, if
+        <tolerance> is given, lat/lon are transformed on a sparse grid and
+        interpolated bilinearly. The sparse grid is refined until the
+        error of interpolation is below <tolerance>.
+
+        Parameters
+        -----------
+        dataType : str or numpy dtype or None
+            data type of the output grids ('float32' or 'float64').
+            If None, grids read from GEOLOCATION bands keep their native
+            data type and computed grids are 'float32'
+        tolerance : float or None
+            maximum error (degrees) of interpolation from a sparse grid for
+            domains with GCPs. If None, all pixels are transformed exactly
+        chunkSize : int or None
+            number of lines in one chunk. By default chunks have
+            approximately 1e6 pixels
+
+        Yields
+        -------
+        yOff : int
+            first line of the chunk
+        longitude, latitude : numpy arrays
+            grids with longitudes and latitudes of the chunk
+
+        Example
+        -------
+        for yOff, lon, lat in d.iterate_geolocation_grids(chunkSize=100):
+            process(lon, lat)
+
+        '''
+        xSize = self.vrt.dataset.RasterXSize
+        ySize = self.vrt.dataset.RasterYSize
+        if chunkSize is None:
+            chunkSize = max(1, 1000000 / xSize)
+
+        # if the vrt dataset has geolocationArray
+        if len(self.vrt.geolocationArray.d) > 0:
+            longitude, latitude = self.get_geolocation_grids(dataType)
+            for yOff in range(0, longitude.shape[0], chunkSize):
+                yield (yOff, longitude[yOff:yOff + chunkSize],
+                       latitude[yOff:yOff + chunkSize])
+            return
+
+        if dataType is None:
+            dataType = 'float32'
+        # select method of transformation
+        if len(self.vrt.dataset.GetGCPs()) == 0:
+            coorTrans = self._get_latlong_transformation()
+            sparseGrid = None
+        elif tolerance is not None:
+            sparseGrid = self._get_sparse_geolocation_grid(tolerance)
+        else:
+            sparseGrid = None
+
+        for yOff in range(0, ySize, chunkSize):
+            rows = np.arange(yOff, min(yOff + chunkSize, ySize))
+            if len(self.vrt.dataset.GetGCPs()) == 0:
+                lon, lat = self._transform_geotransform(coorTrans,
+                                                        np.arange(xSize),
+                                                        rows)
+            elif sparseGrid is not None:
+                lon, lat = self._interpolate_sparse_grid(sparseGrid,
+                                                         np.arange(xSize),
+                                                         rows)
+            else:
+                cols, rows = np.meshgrid(np.arange(xSize), rows)
+                lon, lat = self._transform_points(cols, rows)
+                lon = lon.reshape(cols.shape)
+                lat = lat.reshape(cols.shape)
+
+            yield yOff, lon.astype(dataType), lat.astype(dataType)
+
+    def _get_latlong_transformation(self):
+        '''Get osr transformation from projection of self.vrt into lat/lon
+
+        Returns
+        --------
+        coorTrans : osr.CoordinateTransformation or None
+            None if the projection is already the same as latlongSRS
+
+        '''
+        srcSRS = osr.SpatialReference()
+        srcSRS.ImportFromWkt(self._get_projection(self.vrt.dataset))
+        if srcSRS.IsSame(latlongSRS):
+            return None
+
+        return osr.CoordinateTransformation(srcSRS, latlongSRS)
+
+    def _transform_geotransform(self, coorTrans, cols, rows):
+        '''Transform pixel/line into lat/lon using the GeoTransform
+
+        Parameters
+        -----------
+        coorTrans : osr.CoordinateTransformation or None
+            transformation from the projection into lat/lon
+        cols, rows : 1D numpy arrays
+            pixel and line coordinates of the grid
+
+        Returns
+        --------
+        longitude, latitude : 2D numpy arrays (float64)
+
+        '''
+        gt = self.vrt.dataset.GetGeoTransform()
+        cols, rows = np.meshgrid(cols, rows)
+        x = gt[0] + cols * gt[1] + rows * gt[2]
+        y = gt[3] + cols * gt[4] + rows * gt[5]
+        if coorTrans is None:
+            return x, y
+
+        try:
+            points = np.array(coorTrans.TransformPoints(zip(x.flat, y.flat)))
+        except:
+            return x + np.nan, y + np.nan
+
+        return (points[:, 0].reshape(x.shape),
+                points[:, 1].reshape(x.shape))
+
+    def _get_sparse_geolocation_grid(self, tolerance, nCells=8):
+        '''Get sparse grid of lat/lon with interpolation error < tolerance
+
+        Lat/lon are transformed exactly in the nodes of a regular sparse
+        grid and in centers of its cells. The interpolated values in the
+        centers are compared with the exact ones and the grid is refined
+        (step is halved) until the maximum error is below tolerance.
+
+        Parameters
+        -----------
+        tolerance : float
+            maximum error (degrees) of interpolation
+        nCells : int
+            number of cells along the shortest side of the first grid
+
+        Returns
+        --------
+        sparseGrid : dict
+            'cols', 'rows' : 1D numpy arrays with pixel/line of the nodes
+            'lon', 'lat' : 2D numpy arrays with lat/lon in the nodes
+            (longitude is unwrapped to be continuous across 180)
+
+        '''
+        xSize = self.vrt.dataset.RasterXSize
+        ySize = self.vrt.dataset.RasterYSize
+        step = max(1, min(xSize, ySize) / nCells)
+        while True:
+            # nodes of the grid always include the last pixel/line
+            cols = np.unique(np.r_[np.arange(0, xSize, step), xSize - 1])
+            rows = np.unique(np.r_[np.arange(0, ySize, step), ySize - 1])
+            gridCols, gridRows = np.meshgrid(cols, rows)
+            lon, lat = self._transform_points(gridCols, gridRows)
+            lon = lon.reshape(gridCols.shape)
+            lat = lat.reshape(gridCols.shape)
+
+            # make longitude continuous (along rows and then along columns)
+            lon = np.degrees(np.unwrap(np.radians(lon), axis=1))
+            lon0 = np.degrees(np.unwrap(np.radians(lon[:, 0])))
+            lon += (lon0 - lon[:, 0])[:, None]
+            sparseGrid = {'cols': cols, 'rows': rows, 'lon': lon, 'lat': lat}
+            if step == 1:
+                break
+
+            # compare with exact values in centers of the cells
+            centerCols = (cols[:-1] + cols[1:]) / 2.
+            centerRows = (rows[:-1] + rows[1:]) / 2.
+            lonI, latI = self._interpolate_sparse_grid(sparseGrid,
+                                                       centerCols,
+                                                       centerRows)
+            centerCols, centerRows = np.meshgrid(centerCols, centerRows)
+            lonE, latE = self._transform_points(centerCols, centerRows)
+            lonError = (lonI.flatten() - lonE + 180) % 360 - 180
+            latError = latI.flatten() - latE
+            error = np.nanmax(np.hstack([np.abs(lonError),
+                                         np.abs(latError), 0]))
+            self.logger.debug('Sparse grid step: %d, error: %f'
+                              % (step, error))
+            if error <= tolerance:
+                break
+            step = max(1, step / 2)
+
+        return sparseGrid
+
+    def _interpolate_sparse_grid(self, sparseGrid, cols, rows):
+        '''Bilinear interpolation of lat/lon from sparse grid
+
+        Parameters
+        -----------
+        sparseGrid : dict
+            output of _get_sparse_geolocation_grid()
+        cols, rows : 1D numpy arrays
+            pixel/line coordinates of the output grid
+
+        Returns
+        --------
+        longitude, latitude : 2D numpy arrays (float64)
+            longitude is wrapped into [-180, 180)
+
+        '''
+        # weights for interpolation between rows of the sparse grid
+        rowIndex = np.clip(np.searchsorted(sparseGrid['rows'], rows) - 1,
+                           0, max(0, len(sparseGrid['rows']) - 2))
+        rowIndex1 = np.minimum(rowIndex + 1, len(sparseGrid['rows']) - 1)
+        dRows = (sparseGrid['rows'][rowIndex1] -
+                 sparseGrid['rows'][rowIndex]).astype('float64')
+        dRows[dRows == 0] = 1
+        weights = ((np.array(rows) - sparseGrid['rows'][rowIndex]) /
+                   dRows)[:, None]
+
+        grids = []
+        for gridName in ['lon', 'lat']:
+            # interpolate along rows of the sparse grid then between them
+            grid = np.array([np.interp(cols, sparseGrid['cols'], gridRow)
+                             for gridRow in sparseGrid[gridName]])
+            grids.append(grid[rowIndex] * (1 - weights) +
+                         grid[rowIndex1] * weights)
+        grids[0] = (grids[0] + 180) % 360 - 180
+
+        return grids[0], grids[1]
+
     def _convert_extentDic(self, dstWKT, extentDic):
         '''Convert -lle option (lat/lon) to -te (proper coordinate system)
 
@@ -721,7 +968,8 @@ class Domain():
         rowVector = ([0] * len(rcVector1[0]) + rcVector1[1] +
                      [sizes[1]] * len(rcVector1[0]) + rcVector2[1])
 
-        return self._transform_points(colVector, rowVector)
+        lonVector, latVector = self._transform_points(colVector, rowVector)
+        return lonVector.tolist(), latVector.tolist()
 
     def _get_border_kml(self):
         '''Generate Placemark entry for KML
@@ -791,7 +1039,8 @@ class Domain():
                      self.vrt.dataset.RasterXSize]
         rowVector = [0, self.vrt.dataset.RasterYSize, 0,
                      self.vrt.dataset.RasterYSize]
-        return self._transform_points(colVector, rowVector)
+        lonVector, latVector = self._transform_points(colVector, rowVector)
+        return lonVector.tolist(), latVector.tolist()
 
     def _get_geotransform(self, extentDic):
         '''
@@ -877,45 +1126,82 @@ class Domain():
 
         return projection
 
+    def _get_transformer(self):
+        '''Get GDAL transformer from pixel/line of self.vrt into lat/lon
+
+        The transformer is created only once for the current state of
+        self.vrt (dataset, size, projection, GeoTransform, GCPs and
+        geolocation array) and kept in self.transformer together with the
+        dataset (compared by identity, the reference keeps it alive)
+
+        Returns
+        --------
+        transformer : gdal.Transformer
+
+        '''
+        # get source SRS (either Projection or GCPProjection)
+        srcWKT = self._get_projection(self.vrt.dataset)
+
+        # state of self.vrt which defines the transformer
+        gcps = [(gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY)
+                for gcp in self.vrt.dataset.GetGCPs()]
+        transformerKey = (self.vrt.dataset.RasterXSize,
+                          self.vrt.dataset.RasterYSize, srcWKT,
+                          self.vrt.dataset.GetGeoTransform(), gcps,
+                          sorted(self.vrt.dataset.GetMetadata(
+                                 'GEOLOCATION').items()))
+
+        transformer = getattr(self, 'transformer', None)
+        if (transformer is None or
+                transformer[0] is not self.vrt.dataset or
+                transformer[1] != transformerKey):
+            # prepare target WKT (pure lat/lon)
+            dstWKT = latlongSRS.ExportToWkt()
+
+            # create transformer
+            transformer = (self.vrt.dataset, transformerKey,
+                           gdal.Transformer(self.vrt.dataset, None,
+                                            ['SRC_SRS=' + srcWKT,
+                                             'DST_SRS=' + dstWKT]))
+                                            #,'METHOD=GCP_TPS'])
+            self.transformer = transformer
+
+        return transformer[2]
+
     def _transform_points(self, colVector, rowVector, DstToSrc=0):
         '''Transform given lists of X,Y coordinates into lat/lon
 
         Parameters
         -----------
-        colVector : lists
+        colVector : lists or numpy arrays
             X and Y coordinates with any coordinate system
         DstToSrc : 0 or 1
             1 for inverse transformation, 0 for forward transformation.
 
         Returns
         --------
-        lonVector, latVector : lists
+        lonVector, latVector : numpy arrays
             X and Y coordinates in degree of lat/lon
+            (NaN for points which cannot be transformed)
 
         '''
-        # get source SRS (either Projection or GCPProjection)
-        srcWKT = self._get_projection(self.vrt.dataset)
-
-        # prepare target WKT (pure lat/lon)
-        dstWKT = latlongSRS.ExportToWkt()
-
-        # create transformer
-        transformer = gdal.Transformer(self.vrt.dataset, None,
-                                       ['SRC_SRS=' + srcWKT,
-                                       'DST_SRS=' + dstWKT])
-                                       #,'METHOD=GCP_TPS'])
-
-        # use the transformer to convert pixel/line into lat/lon
-        latVector = []
-        lonVector = []
-        for pixel, line in zip(colVector, rowVector):
-            try:
-                succ, point = transformer.TransformPoint(DstToSrc, pixel, line)
-                lonVector.append(point[0])
-                latVector.append(point[1])
-            except:
-                lonVector.append(np.nan)
-                latVector.append(np.nan)
+        transformer = self._get_transformer()
+
+        # use the transformer to convert all pixel/line into lat/lon at once
+        points = zip(np.array(colVector, 'float64').flat,
+                     np.array(rowVector, 'float64').flat)
+        lonVector = np.zeros(len(points)) + np.nan
+        latVector = np.zeros(len(points)) + np.nan
+        if len(points) == 0:
+            return lonVector, latVector
+        try:
+            points, success = transformer.TransformPoints(DstToSrc, points)
+        except:
+            return lonVector, latVector
+        points = np.array(points)
+        success = np.array(success, 'bool')
+        lonVector[success] = points[success, 0]
+        latVector[success] = points[success, 1]
 
         return lonVector, latVector
 
@@ -6,13 +6,18 @@
 #               http://www.gnu.org/licenses/gpl-3.0.html
 
 from dateutil.parser import parse
-import struct
+import os
+import warnings
 from vrt import VRT, GeolocationArray
 import gdal
 import numpy as np
 import scipy.ndimage
 from nansat_tools import set_defaults
 
+# cache of offsets of datasets read from headers of Envisat files:
+# (fileName, modification time, DS_NAME) => offsetDict
+headerCache = {}
+
 class Envisat():
     '''Methods/data shared between Envisat mappers
 
@@ -69,6 +74,13 @@ class Envisat():
             gdal.GDT_Int32:   ">i",
             gdal.GDT_UInt32:  ">I",
             gdal.GDT_Float32: ">f"}
+    # map: GDAL TYPES ==> numpy big-endian dtypes
+    numpyFmt = {
+            gdal.GDT_Int16:   ">i2",
+            gdal.GDT_UInt16:  ">u2",
+            gdal.GDT_Int32:   ">i4",
+            gdal.GDT_UInt32:  ">u4",
+            gdal.GDT_Float32: ">f4"}
     # names of grids with longitude/latitude in ASAR and MERIS ADS
     lonlatNames = {'ASA_': ['first_line_longs', 'first_line_lats'],
                    'MER_': ['longitude', 'latitude']}
@@ -82,7 +94,8 @@ class Envisat():
         self.lonlatNames  = self.lonlatNames[prodType]
         # create dictionary of envisat parameters
         self.d = {'zoomSize' : 500,
-                  'step': 1}
+                  'step': 1,
+                  'interpolation': 'zoom'}
         # modify the default values using input values
         self.d = set_defaults(self.d, kwargs)
 
@@ -98,12 +111,18 @@ class Envisat():
         Find a location of gadsDSName.
         Adjust the location with textOffset and read the text at the location.
         Convert the text to integer and set it into offsetDict.
+        The offsetDict is cached for each file and gadsDSName.
 
         Returns
         -------
             offsetDict : dictionary
                 offset of DS, size of DS, number of records, size of record
         '''
+        cacheKey = (os.path.abspath(self.iFileName),
+                    os.path.getmtime(self.iFileName), gadsDSName)
+        if cacheKey in headerCache:
+            return dict(headerCache[cacheKey])
+
         # number of lines after line with 'DS_NAME'
         textOffset = {'DS_OFFSET': 3, 'DS_SIZE': 4, 'NUM_DSR': 5, 'DSR_SIZE': 6}
 
@@ -122,6 +141,7 @@ class Envisat():
                                     textOffset[iKey]].replace(iKey+"=", '').
                                     replace('<bytes>', ''))
         f.close()
+        headerCache[cacheKey] = dict(offsetDict)
         return offsetDict
 
     def read_binary_line(self, offset, fmtString, length):
@@ -143,18 +163,70 @@ class Envisat():
                 values which are read from the file.
                 the number of elements is length
         '''
-        # fseek, read all into a list
+        # fseek, read all values at once into a list
         f = file(self.iFileName, 'rb')
         f.seek(offset, 0)
-        binaryValues = []
-        for i in range(length):
-            fString = f.read(struct.calcsize(fmtString))
-            fVal = struct.unpack(fmtString, fString)[0]
-            binaryValues.append(fVal)
+        binaryValues = np.fromfile(f, dtype=np.dtype(fmtString),
+                                   count=length).tolist()
         f.close()
 
         return binaryValues
 
+    def read_ads_arrays(self, adsNames):
+        '''Read 2D arrays of several variables from ADS in one pass
+
+        All records of ADS are read at once with a structured big-endian
+        dtype made from self.allADSParams. To each array the 'last_line_...'
+        values (ASAR) or the last record (MERIS) are appended as the last
+        row.
+
+        Parameters
+        ----------
+            adsNames : list with strings
+                names of varaiables from self.allADSParams['list']
+
+        Returns
+        -------
+            adsArrays : dictionary
+                name => 2D array (float64) with values of the variable
+                (converted to degrees from (10)^-6 deg)
+        '''
+        adsWidth = self.allADSParams['width']
+        adsHeight = self.dsOffsetDict['NUM_DSR']
+
+        # names of variables in the last row of the arrays
+        lastNames = dict([(adsName, adsName.replace('first_line', 'last_line'))
+                          for adsName in adsNames])
+
+        # structured dtype of ADS record with all required variables
+        fieldNames = sorted(set(adsNames + lastNames.values()))
+        recordDtype = np.dtype({
+            'names': fieldNames,
+            'formats': [(self.numpyFmt[self.allADSParams['list'][fieldName]
+                                                         ['dataType']],
+                         adsWidth) for fieldName in fieldNames],
+            'offsets': [self.allADSParams['list'][fieldName]['offset']
+                        for fieldName in fieldNames],
+            'itemsize': self.dsOffsetDict['DSR_SIZE']})
+
+        # read all records of ADS
+        f = file(self.iFileName, 'rb')
+        f.seek(self.dsOffsetDict['DS_OFFSET'], 0)
+        records = np.fromfile(f, dtype=recordDtype, count=adsHeight)
+        f.close()
+
+        adsArrays = {}
+        for adsName in adsNames:
+            array = np.vstack([records[adsName],
+                               records[lastNames[adsName]][-1:]])
+            array = array.astype('float64')
+            # adjust the scale
+            if '(10)^-6' in self.allADSParams['list'][adsName]['units']:
+                array /= 1000000.0
+            adsArrays[adsName] = array
+
+        return adsArrays
+
     def read_scaling_gads(self, indeces):
         ''' Read Scaling Factor GADS to get scalings of MERIS L1/L2
 
@@ -173,10 +245,10 @@ class Envisat():
         #get only values required for the mapper
         return [allGADSValues[i] for i in indeces]
 
-    def create_VRT_from_ADS(self, adsName, **kwargs):
+    def create_VRT_from_ADS(self, adsName, adsArray=None, **kwargs):
         ''' Create VRT with a band from Envisat ADS metadata
 
-        Read offsets of the <adsName> ADS.
+        Read 2D array of the <adsName> ADS (if not given).
         If lineBand is True:
             Read 1D vector of binary values from ADS from file.
             interpolate The array (1D vector) to Xsize.
@@ -192,6 +264,8 @@ class Envisat():
         ----------
             adsName : str
                 name of variable from ADS to read. should match allADSParams
+            adsArray : numpy array
+                2D array of the variable (see read_ads_arrays())
 
         Parameters (**kwargs)
         ---------------------
@@ -207,53 +281,103 @@ class Envisat():
         # modify the default values using input values
         self.d = set_defaults(self.d, kwargs)
 
-        # Get parameters of arrays in ADS
-        adsWidth = self.allADSParams['width']
-        adsParams = self.allADSParams['list'][adsName]
-
-        # get data type format string and size
-        fmtString = self.structFmt[adsParams['dataType']]
-
-        # create an array whose elements are fetched from ADS
-        array = np.array([])
-
-        adsHeight = self.dsOffsetDict["NUM_DSR"]
+        # read the array from ADS
+        if adsArray is None:
+            adsArray = self.read_ads_arrays([adsName])[adsName]
+        array = adsArray
+        adsHeight = array.shape[0]
 
-        # read sequence of 1D arrays from ADS
-        for i in range(adsHeight):
-            lineOffset = (self.dsOffsetDict['DS_OFFSET'] +
-                          adsParams['offset'] +
-                          self.dsOffsetDict["DSR_SIZE"] * i)
-            binaryLine = self.read_binary_line(lineOffset, fmtString, adsWidth)
-            array = np.append(array, binaryLine)
-
-        # read 'last_line_...'
-        adsName = adsName.replace('first_line', 'last_line')
-        adsParams = self.allADSParams['list'][adsName]
-        lineOffset = (self.dsOffsetDict['DS_OFFSET'] +
-                      adsParams['offset'] +
-                      self.dsOffsetDict["DSR_SIZE"] * i)
-        binaryLine = self.read_binary_line(lineOffset, fmtString, adsWidth)
-        array = np.append(array, binaryLine)
-        adsHeight += 1
-
-        # adjust the scale
-        if '(10)^-6' in adsParams['units']:
-            array /= 1000000.0
-            adsParams['units'] = adsParams['units'].replace('(10)^-6 ', '')
-
-        # reshape the array into 2D matrix
-        array = array.reshape(adsHeight, adsWidth)
         # zoom the array
         array = scipy.ndimage.interpolation.zoom(array,
                             self.d['zoomSize'] / float(adsHeight), order=1)
         # create VRT from the array
         adsVrt = VRT(array=array)
         # add "name" and "units" to band metadata
-        bandMetadata = {"name" : adsName, "units" : adsParams['units']}
-        adsVrt.dataset.GetRasterBand(1).SetMetadata(bandMetadata)
+        adsVrt.dataset.GetRasterBand(1).SetMetadata(
+                                        self._get_ads_metadata(adsName))
         return adsVrt
 
+    def _get_ads_metadata(self, adsName):
+        ''' Get name and units of ADS band
+
+        Name and units of the 'last_line_...' variable are used (units are
+        given for the scaled array)
+
+        Returns
+        -------
+            bandMetadata : dictionary with "name" and "units"
+        '''
+        adsName = adsName.replace('first_line', 'last_line')
+        adsUnits = self.allADSParams['list'][adsName]['units']
+        adsUnits = adsUnits.replace('(10)^-6 ', '')
+        return {"name" : adsName, "units" : adsUnits}
+
+    def interpolate_ads(self, adsArray, xSize, ySize, xOff=0, yOff=0,
+                        xWinSize=None, yWinSize=None, step=1, order=1,
+                        isLongitude=False):
+        ''' Interpolate ADS array onto a window of the full size image
+
+        Corners of the ADS grid correspond to corners of the image. Values
+        are interpolated only for pixels/lines of the window (with given
+        step) using scipy.ndimage.map_coordinates
+
+        Parameters
+        ----------
+            adsArray : 2D numpy array
+                array from ADS (see read_ads_arrays())
+            xSize, ySize : int
+                size of the full image
+            xOff, yOff : int
+                offset of the window
+            xWinSize, yWinSize : int
+                size of the window (by default till the end of the image)
+            step : int
+                step, at which data will be given. The output has
+                xWinSize/step columns and yWinSize/step rows (as VRTs
+                resized with the same step)
+            order : int
+                order of spline interpolation (1 - bilinear, 3 - cubic)
+            isLongitude : bool
+                if True, the array is unwrapped before interpolation and
+                wrapped into [-180, 180) after
+
+        Returns
+        -------
+            array : 2D numpy array (float32)
+                interpolated values
+        '''
+        if xWinSize is None:
+            xWinSize = xSize - xOff
+        if yWinSize is None:
+            yWinSize = ySize - yOff
+        cols = xOff + step * np.arange(max(1, xWinSize / step))
+        rows = yOff + step * np.arange(max(1, yWinSize / step))
+
+        # coordinates of the window pixels in the ADS grid
+        gridCols = cols * (adsArray.shape[1] - 1) / float(max(xSize - 1, 1))
+        gridRows = rows * (adsArray.shape[0] - 1) / float(max(ySize - 1, 1))
+
+        # make longitude continuous (along rows and then along columns)
+        if isLongitude:
+            adsArray = np.degrees(np.unwrap(np.radians(adsArray), axis=1))
+            lon0 = np.degrees(np.unwrap(np.radians(adsArray[:, 0])))
+            adsArray += (lon0 - adsArray[:, 0])[:, None]
+
+        # interpolate by chunks of lines (approximately 1e6 pixels)
+        array = np.zeros((len(rows), len(cols)), 'float32')
+        chunkSize = max(1, 1000000 / max(len(cols), 1))
+        for iRow in range(0, len(rows), chunkSize):
+            chunkCols, chunkRows = np.meshgrid(gridCols,
+                                               gridRows[iRow:iRow + chunkSize])
+            array[iRow:iRow + chunkSize] = scipy.ndimage.map_coordinates(
+                                                adsArray,
+                                                [chunkRows, chunkCols],
+                                                order=order, mode='nearest')
+        if isLongitude:
+            array = (array + 180) % 360 - 180
+
+        return array
+
     def get_ads_vrts(self, gdalDataset, adsNames, **kwargs):
         '''Create list with VRTs with zoomed and resized ADS arrays
 
@@ -275,11 +399,20 @@ class Envisat():
                 scipy.zoom
             step : int
                 step, at which data will be given
+            interpolation : str, optional, 'zoom'
+                'zoom' : zoom ADS array to <zoomSize> and resize VRT (warp)
+                'bilinear', 'spline' : interpolate ADS array directly onto
+                the image grid (with <step>), no warping is needed. The
+                arrays are computed when the file is opened and kept in
+                memory, therefore these modes are used only if <step> > 1,
+                otherwise 'zoom' is used (the resized VRT is computed on
+                demand)
 
         Returns
         --------
             adsVRTs: list with VRT
-                list with resized VRT with zoomed arrays
+                list with resized VRT with zoomed arrays (or VRT with
+                interpolated arrays)
         '''
         # modify the default values using input values
         self.d = set_defaults(self.d, kwargs)
@@ -289,9 +422,31 @@ class Envisat():
         # list with VRT with arrays of lon/lat
         adsVRTs = []
 
+        # read all arrays from ADS at once
+        adsArrays = self.read_ads_arrays(adsNames)
+
+        # full size arrays are not interpolated (see docstring)
+        interpolation = self.d['interpolation']
+        if interpolation in ['bilinear', 'spline'] and self.d['step'] <= 1:
+            warnings.warn('Interpolation %s is used only with step > 1, '
+                          'zoom is used instead' % interpolation)
+            interpolation = 'zoom'
+
         for iBand, adsName in enumerate(adsNames):
+            if interpolation in ['bilinear', 'spline']:
+                # interpolate array from ADS onto the image grid
+                order = {'bilinear': 1, 'spline': 3}[interpolation]
+                array = self.interpolate_ads(adsArrays[adsName], XSize, YSize,
+                                     step=self.d['step'], order=order,
+                                     isLongitude=adsName == self.lonlatNames[0])
+                adsVRTs.append(VRT(array=array))
+                adsVRTs[-1].dataset.GetRasterBand(1).SetMetadata(
+                                            self._get_ads_metadata(adsName))
+                continue
             # create VRT with a full-size band from ADS
-            adsVRTs.append(self.create_VRT_from_ADS(adsName,**kwargs))
+            adsVRTs.append(self.create_VRT_from_ADS(adsName,
+                                                    adsArrays[adsName],
+                                                    **kwargs))
             # resize the VRT to match <step>
             adsVRTs[-1] = adsVRTs[-1].resized(XSize/self.d['step'],
                                               YSize/self.d['step'])
@@ -316,6 +471,8 @@ class Envisat():
                 scipy.zoom
             step : int
                 step, at which data will be given
+            interpolation : str, optional, 'zoom'
+                'zoom', 'bilinear' or 'spline' (see get_ads_vrts())
 
         Modifies
         ---------
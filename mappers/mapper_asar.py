@@ -17,6 +17,9 @@ class Mapper(VRT, Envisat):
             http://envisat.esa.int/handbooks/asar/CNTR6-6-9.htm#eph.asar.asardf.asarrec.ASAR_Geo_Grid_ADSR
     '''
 
+    # ENVISAT product name starts with ASA_
+    signature = {'driver': ['ESAT'], 'metadata': {'MPH_PRODUCT': '^ASA_'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         '''
         Parameters (**kwargs)
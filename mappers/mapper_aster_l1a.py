@@ -13,6 +13,10 @@ from nansat_tools import set_defaults
 class Mapper(VRT):
     ''' Mapper for ASTER L1A VNIR data'''
 
+    # L1A file name and ASTER instrument
+    signature = {'fileName': 'AST_L1A_',
+                 'metadata': {'INSTRUMENTSHORTNAME': '^ASTER$'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
         # check if it is ASTER L1A
@@ -12,6 +12,10 @@ import mapper_generic as mg
 
 class Mapper(mg.Mapper):
     '''Mapping for the BEAM/Visat output of Case2Regional algorithm'''
+
+    # netCDF output of BEAM with MERIS file name
+    signature = {'fileName': r'MER_[^/\\]*N1_C2IOP[^/\\]*\.nc$'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         fPathName, fExt = os.path.splitext(fileName)
         fPath, fName = os.path.split(fPathName)
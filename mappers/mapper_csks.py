@@ -15,6 +15,9 @@ import gdal, osr
 class Mapper(VRT):
     ''' VRT with mapping of WKV for Cosmo-Skymed '''
 
+    # name of the file starts with CSKS
+    signature = {'fileName': '^CSKS'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata , **kwargs):
         ''' Create CSKS VRT '''
 
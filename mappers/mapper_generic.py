@@ -5,6 +5,8 @@
 #               under the terms of GNU General Public License, v.3
 #               http://www.gnu.org/licenses/gpl-3.0.html
 
+import base64
+import zlib
 from vrt import *
 from nansat_tools import Node, latlongSRS, set_defaults
 import numpy as np
@@ -202,41 +204,46 @@ class Mapper(VRT):
         if 'start_date' in gdalMetadata:
             self._set_time(parse(gdalMetadata['start_date']))
 
+    def get_metadata_chunks(self, geoMetadata, name):
+        '''Concat values of metadata items <name>_000, <name>_001, ...'''
+        chunks = []
+        while '%s_%03d' % (name, len(chunks)) in geoMetadata:
+            chunks.append(geoMetadata['%s_%03d' % (name, len(chunks))])
+        return ''.join(chunks)
+
     def repare_projection(self, projection):
         '''Replace odd symbols in projection string '|' => ','; '&' => '"' '''
         return projection.replace("|",",").replace("&",'"')
 
     def add_gcps_from_metadata(self, geoMetadata):
-        '''Get GCPs from strings in metadata and insert in dataset'''
-        gcpNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
-        gcpAllValues = []
-        # for all gcp coordinates
-        for i, gcpName in enumerate(gcpNames):
-            # scan throught metadata and find how many lines with each GCP
-            gcpLineCount = 0
-            for metaDataItem in geoMetadata:
-                if gcpName in metaDataItem:
-                    gcpLineCount += 1
-            # concat all lines
-            gcpString = ''
-            for n in range(0, gcpLineCount):
-                gcpLineName = '%s_%03d' % (gcpName, n)
-                gcpString += geoMetadata[gcpLineName]
-            # convert strings to floats
-            gcpString = gcpString.strip().replace(' ','')
-            gcpValues = []
-            # append all gcps from string
-            for x in gcpString.split('|'):
-                if len(x) > 0:
-                    gcpValues.append(float(x))
-            #gcpValues = [float(x) for x in gcpString.strip().split('|')]
-            gcpAllValues.append(gcpValues)
+        '''Get GCPs from strings in metadata and insert in dataset
+
+        GCPs are read either from compact binary format (GCPs_000, ...,
+        see VRT._add_gcp_metadata()) or from old text format
+        (GCPPixel_000, GCPLine_000, GCPX_000, GCPY_000, ...)
+        '''
+        if 'GCPs_000' in geoMetadata:
+            # concat all chunks, decode and decompress array of float64
+            gcpString = self.get_metadata_chunks(geoMetadata, 'GCPs')
+            gcpArray = np.fromstring(zlib.decompress(
+                                     base64.b64decode(gcpString)), '<f8')
+            gcpArray = gcpArray.reshape(-1, 4)
+        else:
+            gcpNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
+            gcpAllValues = []
+            # for all gcp coordinates
+            for gcpName in gcpNames:
+                # concat all lines and remove spaces
+                gcpString = self.get_metadata_chunks(geoMetadata, gcpName)
+                gcpString = gcpString.replace(' ', '')
+                # convert strings to floats
+                gcpAllValues.append(np.array([x for x in gcpString.split('|')
+                                              if len(x) > 0], 'float64'))
+            gcpArray = np.array(gcpAllValues).T
 
         # create list of GDAL GCPs
-        gcps = []
-        for i in range(0, len(gcpAllValues[0])):
-            gcps.append(gdal.GCP(gcpAllValues[2][i], gcpAllValues[3][i], 0,
-                                 gcpAllValues[0][i], gcpAllValues[1][i]))
+        gcps = [gdal.GCP(gcpX, gcpY, 0, gcpPixel, gcpLine)
+                for gcpPixel, gcpLine, gcpX, gcpY in gcpArray.tolist()]
 
         if len(gcps) > 0:
             # get GCP projection and repare
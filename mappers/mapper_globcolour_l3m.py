@@ -18,6 +18,9 @@ from vrt import VRT, GeolocationArray
 class Mapper(VRT):
     ''' Mapper for GLOBCOLOR L3M products'''
 
+    # title of the netCDF file
+    signature = {'metadata': {'NC_GLOBAL#title': 'GlobColour'}}
+
     # detect wkv from metadata 'Parameter'
     varname2wkv = {
     'CHL1_mean': 'mass_concentration_of_chlorophyll_a_in_sea_water',
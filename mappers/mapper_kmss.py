@@ -21,6 +21,9 @@ from domain import Domain
 class Mapper(VRT):
     ''' VRT with mapping of WKV for KMSS TOA tiff data'''
 
+    # name of the GeoTIFF file starts with 101_ or 102_
+    signature = {'fileName': r'(^|[/\\])10[12]_[^/\\]*tif$'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, logLevel=10,  **kwargs):
         ''' Create VRT '''
         product = gdalDataset.GetDriver().LongName
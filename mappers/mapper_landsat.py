@@ -19,6 +19,11 @@ except ImportError:
 class Mapper(VRT):
     ''' Mapper for LANDSAT3,4,5,6,7,8.tar.gz files'''
 
+    # gzip, bzip2 or tar archive
+    signature = [{'magic': (0, '\x1f\x8b')},
+                 {'magic': (0, 'BZh')},
+                 {'magic': (257, 'ustar')}]
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create LANDSAT VRT '''
         # try to open .tar or .tar.gz or .tgz file with tar
@@ -11,6 +11,10 @@ from envisat import Envisat
 class Mapper(VRT, Envisat):
     ''' VRT with mapping of WKV for MERIS Level 1 (FR or RR) '''
 
+    # ENVISAT product name of MERIS L1 (FR or RR)
+    signature = {'driver': ['ESAT'],
+                 'metadata': {'MPH_PRODUCT': '^MER_(FRS|RR_)_1'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create MER1 VRT '''
         # get ENVISAT MPH_PRODUCT
@@ -11,6 +11,10 @@ from envisat import Envisat
 class Mapper(VRT, Envisat):
     ''' Create VRT with mapping of WKV for MERIS Level 2 (FR or RR) '''
 
+    # ENVISAT product name of MERIS L2 (FR or RR)
+    signature = {'driver': ['ESAT'],
+                 'metadata': {'MPH_PRODUCT': '^MER_(FRS|RR_)_2'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         product = gdalMetadata["MPH_PRODUCT"]
 
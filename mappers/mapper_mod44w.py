@@ -11,6 +11,9 @@ import os.path
 class Mapper(VRT):
     ''' VRT with mapping of WKV for MOD44W produc (MODIS watermask at 250 m)'''
 
+    # VRT file with mosaic of the watermask tiles
+    signature = {'fileName': r'(^|[/\\])MOD44W\.vrt$'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
 
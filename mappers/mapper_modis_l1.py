@@ -10,6 +10,9 @@ from vrt import VRT, gdal, parse
 class Mapper(VRT):
     ''' VRT with mapping of WKV for MODIS Level 1 (QKM, HKM, 1KM) '''
 
+    # short name of MODIS L1B products
+    signature = {'metadata': {'SHORTNAME': '^M[OY]D02(QKM|HKM|1KM)$'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create MODIS_L1 VRT '''
         #get 1st subdataset and parse to VRT.__init__() for retrieving geo-metadata
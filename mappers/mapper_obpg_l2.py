@@ -8,7 +8,8 @@
 from vrt import GeolocationArray, VRT, gdal, osr, latlongSRS
 from datetime import datetime, timedelta
 from math import ceil
-from nansat_tools import set_defaults
+import numpy as np
+from nansat_tools import set_defaults, latlon2gcps, refine_gcp_indices
 
 class Mapper(VRT):
     ''' Mapper for SeaWIFS/MODIS/MERIS/VIIRS L2 data from OBPG
@@ -18,10 +19,15 @@ class Mapper(VRT):
     * Test on MODIS Terra
     '''
 
+    # title of the L2 file
+    signature = {'metadata': {'Title': '^(HMODISA|MODISA|MERIS) Level-2 Data$'}}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
         # number of GCPs along each dimention
-        kwDict = {'GCP_COUNT' : 10}
+        # and tolerance (deg.) for adding GCPs where lat/lon are not linear
+        kwDict = {'GCP_COUNT' : 10,
+                  'GCP_TOLERANCE' : None}
 
         # init ADS parameters
         obpgL2Kwargs = {}
@@ -182,21 +188,20 @@ class Mapper(VRT):
                           latitude.shape[0], latitude.shape[1],
                           kwDict['GCP_COUNT'], step0, step1)
 
-        # generate list of GCPs
-        gcps = []
-        k = 0
-        for i0 in range(0, latitude.shape[0], step0):
-            for i1 in range(0, latitude.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                lon = float(longitude[i0, i1])
-                lat = float(latitude[i0, i1])
-                if (lon >= -180 and lon <= 180 and lat >= -90 and lat <= 90):
-                    gcp = gdal.GCP(lon, lat, 0, i1 * pixelStep, i0 * lineStep)
-                    self.logger.debug('%d %d %d %f %f',
-                                      k, gcp.GCPPixel, gcp.GCPLine,
-                                      gcp.GCPX, gcp.GCPY)
-                    gcps.append(gcp)
-                    k += 1
+        # select pixels of GCPs
+        rows = np.arange(0, latitude.shape[0], step0)
+        cols = np.arange(0, latitude.shape[1], step1)
+        if kwDict['GCP_TOLERANCE'] is None:
+            colIndices, rowIndices = np.meshgrid(cols, rows)
+        else:
+            rowIndices, colIndices = refine_gcp_indices(latitude, longitude,
+                                                rows, cols,
+                                                kwDict['GCP_TOLERANCE'])
+
+        # generate list of GCPs (with valid lat/lon only)
+        gcps = latlon2gcps(latitude, longitude, rowIndices, colIndices,
+                           lineStep=lineStep, pixelStep=pixelStep)
+        self.logger.debug('Number of GCPs: %d', len(gcps))
 
         # append GCPs and lat/lon projection to the vsiDataset
         self.dataset.SetGCPs(gcps, latlongSRS.ExportToWkt())
@@ -19,6 +19,9 @@ class Mapper(VRT):
     ''' Mapper for Level-3 Standard Mapped Image from
     http://oceancolor.gsfc.nasa.gov'''
 
+    # title of the L3 file
+    signature = {'metadata': {'Title': 'Level-3 Standard Mapped Image'}}
+
     # detect wkv from metadata 'Parameter'
     param2wkv = {
     'Chlorophyll a concentration': 'mass_concentration_of_chlorophyll_a_in_sea_water',
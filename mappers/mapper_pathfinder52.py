@@ -18,6 +18,9 @@ class Mapper(vrt.VRT):
     * remote files
     '''
 
+    # name of the file
+    signature = {'fileName': r'AVHRR_Pathfinder-PFV5\.2'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
 
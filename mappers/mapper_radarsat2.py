@@ -24,6 +24,10 @@ import pdb
 class Mapper(VRT):
     ''' Create VRT with mapping of WKV for Radarsat2 '''
 
+    # product.xml opened by GDAL or zipped product
+    signature = [{'metadata': {'SATELLITE_IDENTIFIER': '^RADARSAT-2$'}},
+                 {'fileName': r'\.(zip|ZIP)$'}]
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create Radarsat2 VRT '''
         fPathName, fExt = os.path.splitext(fileName)
@@ -14,6 +14,9 @@ from scipy.io import loadmat
 class Mapper(VRT):
     ''' MApper for Matlab files with SMOS data '''
 
+    # Matlab file with SMOS data
+    signature = {'fileName': r'(\.MAT$)|(OSUDP2[^/\\]*\.mat$)'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create SMOS VRT '''
         # check extension
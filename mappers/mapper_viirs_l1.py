@@ -15,6 +15,9 @@ from nansat_tools import set_defaults
 class Mapper(VRT):
     ''' VRT with mapping of WKV for VIIRS Level 1B '''
 
+    # name of the geolocation file
+    signature = {'fileName': 'GMTCO_npp_'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VIIRS VRT '''
 
@@ -16,10 +16,82 @@
 # but WITHOUT ANY WARRANTY without even the implied warranty of
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 
-import scipy.stats as st
+import multiprocessing
 
 # import standard and additional libraries
 from nansat import *
+from vrt import spillOptions, set_spill, _get_spill_directory
+
+def nanquantile(dataCube, quantile):
+    '''Calculate quantile of 3D cube along the first axis ignoring NaN
+
+    Linear interpolation between the closest ranks is used (as in
+    numpy.percentile). For quantile=0.5 the result equals the median.
+
+    Parameters
+    -----------
+    dataCube : 3D Numpy array
+        data (N x rows x cols)
+    quantile : float
+        quantile, from 0 to 1
+
+    Returns
+    --------
+    dataQuantile : 2D Numpy array (rows x cols)
+        NaN where all values are NaN
+
+    '''
+    # NaNs are sorted to the end
+    dataCube = np.sort(dataCube, axis=0)
+    cnt = (~np.isnan(dataCube)).sum(axis=0)
+
+    # position of the quantile among valid values
+    pos = quantile * (np.maximum(cnt, 1) - 1)
+    posLow = np.floor(pos).astype('int32')
+    posHigh = np.ceil(pos).astype('int32')
+    rows, cols = np.indices(cnt.shape)
+    valLow = dataCube[posLow, rows, cols]
+    valHigh = dataCube[posHigh, rows, cols]
+    dataQuantile = valLow + (valHigh - valLow) * (pos - posLow)
+    dataQuantile[cnt == 0] = np.nan
+
+    return dataQuantile
+
+def average_worker(args):
+    '''Get partial statistics of files for Mosaic.average() in a subprocess
+
+    Parameters
+    -----------
+    args : tuple
+        domainXML : str, VRT-XML with the destination domain
+        d : dict, parameters of Mosaic (Mosaic.d)
+        files, bands, doReproject, maskName : see Mosaic.average()
+        logLevel : int, level of logging
+        spill : tuple, threshold and directory for set_spill(). The
+            directory is created by the parent process and removed at its
+            exit (subprocesses exit without cleanup)
+
+    Returns
+    --------
+    partial : dictionary, see Mosaic._get_partial_average()
+
+    '''
+    (domainXML, d, files, bands, doReproject, maskName,
+     logLevel, spill) = args
+
+    # spill large arrays into the scratch directory of the parent process
+    set_spill(*spill)
+
+    # limit memory used by GDAL in this process
+    if d['cacheSize'] is not None:
+        gdal.SetCacheMax(int(d['cacheSize'] * 1024 * 1024))
+
+    # create Mosaic on the same domain
+    mosaic = Mosaic(domain=Domain(ds=gdal.Open(domainXML)),
+                    logLevel=logLevel)
+    mosaic._set_defaults(d)
+
+    return mosaic._get_partial_average(files, bands, doReproject, maskName)
 
 class Mosaic(Nansat):
     '''Container for mosaicing methods
@@ -33,6 +105,10 @@ class Mosaic(Nansat):
     d['mapperName'] = ''
     d['eResampleAlg'] = 0
     d['period'] = None, None
+    d['nProcesses'] = 1
+    d['cacheSize'] = None
+    d['quantiles'] = [0.5]
+    d['memoryLimit'] = 512
 
     def _set_defaults(self, dict):
         '''Check input params and set defaut values
@@ -167,17 +243,129 @@ class Mosaic(Nansat):
                 
         return n, mask
 
-    def _get_cube(self, files, band, doReproject, maskName):
-        '''Make cube with data from one band of input files
+    def _get_layers(self, files, doReproject, maskName):
+        '''Open and reproject input files
+
+        Open files, add mask to files without mask and reproject. Only
+        the VRTs are created, no data is read.
+
+        Parameters:
+        -----------
+        files : list of strings
+            input filenames
+        doReproject : boolean
+            Should we reproject input files?
+        maskName : string
+            Name of the mask in the input file
+
+        Returns:
+        --------
+        layers : list of Nansat objects
+            None for files which cannot be opened or reprojected
+        '''
+        layers = []
+        for f in files:
+            self.logger.info('Opening %s' % f)
+            n = self._get_layer_image(f)
+            if n is not None:
+                # add mask band [64: data], if not available
+                try:
+                    n.get_GDALRasterBand(maskName)
+                except:
+                    self.logger.error('Cannot get mask from %s' % f)
+                    mask = 64 * np.ones(n.shape()).astype('int8')
+                    n.add_band(array=mask, parameters={'name': maskName})
+
+            if n is not None and doReproject:
+                try:
+                    n.reproject(self, eResampleAlg=self.d['eResampleAlg'])
+                except:
+                    self.logger.error('Unable to reproject %s' % f)
+                    n = None
+            layers.append(n)
+
+        return layers
+
+    def _get_cube(self, layers, bands, maskName, window=None):
+        '''Make cubes with data from bands of input files
         
-        Open files, reproject, get band, insert into cube
+        Read windows of bands and mask from opened files, insert into cubes
         
         Parameter:
         ----------
+        layers : list of Nansat objects
+            opened (and reprojected) input files, see _get_layers()
+        bands : list of int or string
+            IDs of the bands
+        maskName : string
+            Name of the mask in the input file
+        window : list of four ints or None
+            xOff, yOff, xSize, ySize of the window to read. If None, the
+            entire bands are read
+
+        Returns:
+        --------
+        dataCubes : dictionary with Numpy 3D arrays for each band
+        mask : Numpy array with L2-mask
+        '''
+        if window is None:
+            window = [0, 0, self.shape()[1], self.shape()[0]]
+        cubeShape = (len(layers), window[3], window[2])
+
+        # preallocate 3D cubes and mask
+        # (NaN in layers of files which cannot be read)
+        self.logger.debug('Allocating 3D cubes')
+        dataCubes = {}
+        for band in bands:
+            dataCubes[band] = np.zeros(cubeShape, 'float32') + np.nan
+        maskMat = np.zeros((2, window[3], window[2]), 'int8')
+
+        # for all input files
+        for i, n in enumerate(layers):
+            if n is None:
+                continue
+            self.logger.debug('Reading window from %s' % n.fileName)
+
+            # get mask
+            try:
+                mask = n.get_window(maskName, *window)
+            except:
+                # zeros (out of swath) block this image from the cube
+                self.logger.error('No mask in reprojected file %s!'
+                                  % n.fileName)
+                mask = np.zeros((window[3], window[2]), 'int8')
+
+            for band in bands:
+                # get band from input image
+                a = None
+                try:
+                    a = n.get_window(band, *window).astype('float32')
+                except:
+                    self.logger.error('%s is not in %s' % (band, n.fileName))
+                if a is not None:
+                    # mask invalid data
+                    a[mask <= 2] = np.nan
+                    # add band to the cube
+                    dataCubes[band][i, :, :] = a
+
+            # add data to mask matrix (maximum of 0, 1, 2, 64)
+            maskMat[0, :, :] = mask
+            maskMat[1, :, :] = maskMat.max(0)
+            
+        return dataCubes, maskMat.max(0)
+
+    def _get_partial_average(self, files, bands, doReproject, maskName):
+        '''Get statistics of bands and mask from input files
+
+        Open files one by one, reproject, get mask and bands and add valid
+        data to the accumulators of statistics.
+
+        Parameters:
+        -----------
         files : list of strings
             input filenames
-        band : int or string
-            ID of the band
+        bands : list
+            names/band_numbers to be processed
         doReproject : boolean
             Should we reproject input files?
         maskName : string
@@ -185,13 +373,22 @@ class Mosaic(Nansat):
 
         Returns:
         --------
-        dataCube : Numpy 3D array with bands
-        mask : Numpy array with L2-mask
+        partial : dictionary
+            'acc' : dict with Accumulator of valid values of each band
+            'mask' : 2D matrix with maximum of mask values (0, 1, 2, 64)
+            'lastFile' : name of the last processed file (or None)
         '''
-        # preallocate 3D cube and mask
-        self.logger.debug('Allocating 3D cube')
-        dataCube = np.zeros((len(files), self.shape()[0], self.shape()[1]))
-        maskMat = np.zeros((2, self.shape()[0], self.shape()[1]), 'int8')
+        # get desired shape
+        dstShape = self.shape()
+        self.logger.debug('dstShape: %s' % str(dstShape))
+
+        # preallocate accumulators of statistics and mask
+        self.logger.debug('Allocating 2D matrices')
+        accMat = {}
+        for b in bands:
+            accMat[b] = Accumulator(dstShape)
+        maskMat = np.zeros((2, dstShape[0], dstShape[1]), 'int8')
+        lastFile = None
 
         # for all input files
         for i, f in enumerate(files):
@@ -199,26 +396,67 @@ class Mosaic(Nansat):
 
             # get image and mask
             n, mask = self._get_layer(f, doReproject, maskName)
-            if n is None:
-                continue
-            # get band from input image
-            a = None
-            try:
-                a = n[band].astype('float32')
-            except:
-                self.logger.error('%s is not in %s' % (band, n.fileName))
-            if a is not None:
-                # mask invalid data
-                a[mask <= 2] = np.nan
-            
-            # add band to the cube
-            dataCube[i, :, :] = a
 
+            if n is not None:
+                # keep name of the last image opened
+                lastFile = f
+            else:
+                # skip processing of invalid image
+                continue
             # add data to mask matrix (maximum of 0, 1, 2, 64)
             maskMat[0, :, :] = mask
             maskMat[1, :, :] = maskMat.max(0)
-            
-        return dataCube, maskMat.max(0)
+
+            # add data to accumulators
+            for b in bands:
+                self.logger.debug('    Adding %s to statistics' % b)
+                # get projected data from Nansat object
+                a = None
+                try:
+                    a = n[b]
+                except:
+                    self.logger.error('%s is not in %s' % (b, n.fileName))
+                if a is not None:
+                    # add only valid data
+                    accMat[b].add(a, mask == 64)
+            # destroy
+            n = None
+
+        return {'acc': accMat, 'mask': maskMat.max(0), 'lastFile': lastFile}
+
+    def _merge_partial_averages(self, partials):
+        '''Merge partial statistics from several subsets of input files
+
+        Partial statistics are merged pairwise (tree reduction) in the order of
+        the subsets, so that the result does not depend on the order in
+        which the subprocesses finish.
+
+        Parameters:
+        -----------
+        partials : list of dictionaries
+            see _get_partial_average()
+
+        Returns:
+        --------
+        partial : dictionary
+            merged statistics, see _get_partial_average()
+        '''
+        while len(partials) > 1:
+            merged = []
+            for i in range(0, len(partials) - 1, 2):
+                p0, p1 = partials[i], partials[i + 1]
+                for b in p0['acc']:
+                    p0['acc'][b].merge(p1['acc'][b])
+                p0['mask'] = np.maximum(p0['mask'], p1['mask'])
+                if p1['lastFile'] is not None:
+                    p0['lastFile'] = p1['lastFile']
+                merged.append(p0)
+            # odd partial goes to the next level without merging
+            if len(partials) % 2 == 1:
+                merged.append(partials[-1])
+            partials = merged
+
+        return partials[0]
 
     def average(self, files=[], bands=[], doReproject=True, maskName='mask',
                **kwargs):
@@ -260,6 +498,12 @@ class Mosaic(Nansat):
             This mapper is used to read input files
         eResampleAlg : int, [0]
             agorithm for reprojection, see Nansat.reproject()
+        nProcesses : int, [1]
+            number of subprocesses. Input files are split into nProcesses
+            subsets, each subset is processed in a separate process
+        cacheSize : int, [None]
+            size of GDAL cache in MB in each subprocess (limits memory
+            consumed by each process in addition to the accumulators)
 
         '''
         # check inputs
@@ -273,78 +517,50 @@ class Mosaic(Nansat):
         # modify default values
         self._set_defaults(kwargs)
 
-        # get desired shape
-        dstShape = self.shape()
-        self.logger.debug('dstShape: %s' % str(dstShape))
+        nProcesses = max(1, min(int(self.d['nProcesses']), len(files)))
+        if nProcesses == 1:
+            # get statistics from all files in this process
+            partial = self._get_partial_average(files, bands, doReproject,
+                                                maskName)
+        else:
+            # split files into continuous subsets, one per process
+            domainXML = self.vrt.read_xml()
+            # scratch directory for spilled arrays is created here: it would
+            # not be removed if created in a subprocess
+            spill = (spillOptions['threshold'], None)
+            if spillOptions['threshold'] is not None:
+                spill = (spillOptions['threshold'], _get_spill_directory())
+            subsets = np.array_split(np.arange(len(files)), nProcesses)
+            tasks = [(domainXML, dict(self.d),
+                      [files[i] for i in subset], bands,
+                      doReproject, maskName, self.logger.level, spill)
+                     for subset in subsets]
+            self.logger.info('Processing %d files in %d processes'
+                             % (len(files), nProcesses))
+            pool = multiprocessing.Pool(nProcesses)
+            try:
+                # map() keeps order of subsets
+                partials = pool.map(average_worker, tasks)
+            finally:
+                pool.close()
+                pool.join()
+            partial = self._merge_partial_averages(partials)
+
+        if partial['lastFile'] is None:
+            self.logger.error('No valid input files!')
+            return
+        # open last valid image for reading metadata
+        lastN = self._get_layer_image(partial['lastFile'])
+        maskMat = partial['mask']
 
-        # preallocate 2D matrices for sum, sum of squares, count of products
-        # and mask
-        self.logger.debug('Allocating 2D matrices')
+        # average products
         avgMat = {}
         stdMat = {}
-        for b in bands:
-            avgMat[b] = np.zeros((dstShape[0], dstShape[1]))
-            stdMat[b] = np.zeros((dstShape[0], dstShape[1]))
-
-        cntMat = np.zeros((dstShape[0], dstShape[1]), 'float16')
-        maskMat = np.zeros((2, dstShape[0], dstShape[1]), 'int8')
-
-        # for all input files
-        for i, f in enumerate(files):
-            self.logger.info('Processing %s' % f)
-
-            # get image and mask
-            n, mask = self._get_layer(f, doReproject, maskName)
-
-            if n is not None:
-                # keep last image opened
-                lastN = self._get_layer_image(f) 
-            else:
-                # skip processing of invalid image
-                continue
-            # add data to counting matrix
-            cntMatTmp = np.zeros((dstShape[0], dstShape[1]), 'float16')
-            cntMatTmp[mask == 64] = 1
-            cntMat += cntMatTmp
-            # add data to mask matrix (maximum of 0, 1, 2, 64)
-            maskMat[0, :, :] = mask
-            maskMat[1, :, :] = maskMat.max(0)
-
-            # add data to summation matrix
-            for b in bands:
-                self.logger.debug('    Adding %s to sum' % b)
-                # get projected data from Nansat object
-                a = None
-                try:
-                    a = n[b]
-                except:
-                    self.logger.error('%s is not in %s' % (b, n.fileName))
-                if a is not None:
-                    # mask invalid data
-                    a[mask < 64] = 0
-                    # sum of valid values and squares
-                    avgMat[b] += a
-                    stdMat[b] += np.square(a)
-            # destroy
-            n = None
-
-        # average products
-        cntMat[cntMat == 0] = np.nan
         for b in bands:
             self.logger.debug('    Averaging %s' % b)
-            # get average
-            avg = avgMat[b] / cntMat
-            # calculate STD
-            # STD = sqrt(sum((x-M)^2)/n) = (sqrt((sum(x^2) -
-            #                                2*mean(x)*sum(x) +
-            #                                sum(mean(x)^2))/n))
-            stdMat[b] = np.sqrt((stdMat[b] - 2.0 * avg * avgMat[b] +
-                                np.square(avg) * cntMat) / cntMat)
-            # set std
-            avgMat[b] = avg
-
-        # calculate mask (max of 0, 1, 2, 4, 64)
-        maskMat = maskMat.max(0)
+            avgMat[b] = partial['acc'][b].get_mean()
+            stdMat[b] = partial['acc'][b].get_std()
+
         # if old 'valid' mask was applied in files, replace with new mask
         maskMat[maskMat == 128] = 64
 
@@ -368,10 +584,11 @@ class Mosaic(Nansat):
 
     def median(self, files=[], bands=[], doReproject=True, maskName='mask',
                **kwargs):
-        '''Calculate median of input bands
+        '''Calculate median (or other quantiles) of input bands
         
-        Memory and CPU greedy method. Generates 3D cube from bands of
-        all input images and calculates median. Adds median bands to self
+        Generates 3D cubes from bands of all input images tile by tile and
+        calculates median (exact) of each tile. Size of tiles is limited by
+        memoryLimit. Adds median bands to self
 
         Parameters
         -----------
@@ -389,20 +606,68 @@ class Mosaic(Nansat):
             This mapper is used to read input files
         eResampleAlg : int, [0]
             agorithm for reprojection, see Nansat.reproject()
+        quantiles : list of floats, [[0.5]]
+            quantiles (from 0 to 1) to calculate. Bands with median (0.5)
+            have the same name as input bands, other quantiles have
+            suffix (e.g. 'chlor_a_p90' for 0.9)
+        memoryLimit : int, [512]
+            approximate size of the 3D cubes in memory, MB. Input files
+            are opened and reprojected once, only windows of the bands
+            are read for each tile.
 
         '''
         # modify default values
         self._set_defaults(kwargs)
-        lastN = self._get_layer_image(files[-1])
-        # add medians of all bands
+
+        # open and reproject all files once
+        layers = self._get_layers(files, doReproject, maskName)
+        validLayers = [n for n in layers if n is not None]
+        if len(validLayers) == 0:
+            self.logger.error('No valid input files!')
+            return
+        # last valid image is used for reading metadata
+        lastN = validLayers[-1]
+
+        # preallocate results
+        dstShape = self.shape()
+        quantiles = self.d['quantiles']
+        bandQuantiles = {}
         for band in bands:
-            bandCube, mask = self._get_cube(files, band, doReproject, maskName)
-            bandMedian = st.nanmedian(bandCube, axis=0)
-            
-            # get metadata of this band from the last image
-            parameters = lastN.get_metadata(bandID=band)
-            # add band and std with metadata
-            self.add_band(array=bandMedian, parameters=parameters)
+            bandQuantiles[band] = [np.zeros(dstShape, 'float32')
+                                   for quantile in quantiles]
+        mask = np.zeros(dstShape, 'int8')
+
+        # number of lines in one tile
+        # (float32 cubes for all bands and one sorted copy)
+        lineSize = len(files) * dstShape[1] * 4 * (len(bands) + 1)
+        tileLines = max(1, int(self.d['memoryLimit'] * 1024 * 1024 /
+                               lineSize))
+        self.logger.debug('Lines in one tile: %d' % tileLines)
+
+        # calculate quantiles of all bands tile by tile
+        for yOff in range(0, dstShape[0], tileLines):
+            ySize = min(tileLines, dstShape[0] - yOff)
+            window = [0, yOff, dstShape[1], ySize]
+            bandCubes, tileMask = self._get_cube(layers, bands, maskName,
+                                                 window)
+            mask[yOff:yOff + ySize, :] = tileMask
+            for band in bands:
+                for i, quantile in enumerate(quantiles):
+                    bandQuantiles[band][i][yOff:yOff + ySize, :] = (
+                                nanquantile(bandCubes[band], quantile))
+            bandCubes = None
+
+        # add quantiles of all bands
+        for band in bands:
+            for i, quantile in enumerate(quantiles):
+                # get metadata of this band from the last image
+                parameters = lastN.get_metadata(bandID=band)
+                if quantile != 0.5:
+                    parameters['name'] = (parameters['name'] +
+                                          '_p%g' % (quantile * 100))
+                # add band with metadata
+                self.add_band(array=bandQuantiles[band][i],
+                              parameters=parameters)
 
         self.add_band(array=mask, parameters={'name': 'mask'})
 
@@ -410,10 +675,12 @@ class Mosaic(Nansat):
                **kwargs):
         '''Mosaic by adding the latest image on top without averaging
         
+        Opens and reprojects each input file only once;
         Uses Nansat.get_time() to estimate time of each input file;
-        Sorts images by aquisition time;
-        Creates date_index band - with mask of coverage of each frame;
-        Uses date_index to fill bands of self only with the latest data
+        Keeps grid with time of the latest valid data in each pixel and
+        overwrites pixels of bands with data from files with later time;
+        Creates date_index band - with mask of coverage of each frame
+        (serial numbers of files sorted by aquisition time)
         
         Parameters
         -----------
@@ -433,54 +700,46 @@ class Mosaic(Nansat):
             agorithm for reprojection, see Nansat.reproject()
         
         '''
-        # collect ordinals of times of each input file
-        itimes = np.zeros(len(files))
-        for i in range(len(files)):
-            n = self._get_layer_image(files[i])
-            nstime = n.get_time()[0]
-            if nstime is None:
-                nstime = 693596 #1900-01-01
-            else:
-                nstime = nstime.toordinal()
-            itimes[i] = nstime
-
-        # sort times
-        ars = np.argsort(itimes)
-
-        # maxIndex keeps mask of coverae of each frame
-        maxIndex = np.zeros((2, self.shape()[0], self.shape()[1]))
-        for i in range(len(files)):
-            # open file and get mask
-            n, mask = self._get_layer(files[ars[i]], doReproject, maskName)
-            # fill matrix with serial number of the file
-            maskIndex = (np.zeros(mask.shape) + i + 1).astype('uint16')
-            # erase non-valid values
-            maskIndex[mask != 64] = 0
-            # first layer of maxIndex keeps serial number of this file
-            maxIndex[0, :, :] = maskIndex
-            # second layer of maxIndex keeps maximum serial number
-            # or serial number of the latest image
-            maxIndex[1, :, :] = maxIndex.max(0)
-        maxIndex = maxIndex.max(0)
-        
-        # preallocate 2D matrices for mosaiced data and mask
+        # modify default values
+        self._set_defaults(kwargs)
+
+        # preallocate 2D matrices for mosaiced data, mask, time of the latest
+        # data and serial number of the latest file
         self.logger.debug('Allocating 2D matrices')
+        dstShape = self.shape()
         avgMat = {}
         for b in bands:
-            avgMat[b] = np.zeros((maxIndex.shape[0], maxIndex.shape[1]))
-        maskMat = np.zeros((maxIndex.shape[0], maxIndex.shape[1]))
-
-        for i in range(len(files)):
-            f = files[ars[i]]
+            avgMat[b] = np.zeros(dstShape)
+        maskMat = np.zeros(dstShape)
+        timeMat = np.zeros(dstShape) - np.inf
+        fileIndex = np.zeros(dstShape, 'uint16')
+
+        # times of input files (ordinals with fraction of day)
+        itimes = np.zeros(len(files)) + 693596 #1900-01-01
+        lastN = None
+        for i, f in enumerate(files):
             self.logger.info('Processing %s' % f)
 
             # get image and mask
             n, mask = self._get_layer(f, doReproject, maskName)
             if n is None:
                 continue
-            # insert mask into result only for pixels masked
-            # by the serial number of the input file
-            maskMat[maxIndex == (i + 1)] = mask[maxIndex == (i + 1)]
+
+            # get time of the image
+            nstime = n.get_time()[0]
+            if nstime is not None:
+                nsday = nstime.replace(hour=0, minute=0, second=0,
+                                       microsecond=0)
+                itimes[i] = (nstime.toordinal() +
+                             (nstime - nsday).seconds / 86400.)
+
+            # pixels with valid data not later than the image
+            # (of equal times, the latest in the list of files is taken)
+            gpi = (mask == 64) * (timeMat <= itimes[i])
+            timeMat[gpi] = itimes[i]
+            fileIndex[gpi] = i + 1
+            # insert mask into result
+            maskMat[gpi] = mask[gpi]
 
             # insert data into mosaic matrix
             for b in bands:
@@ -492,14 +751,27 @@ class Mosaic(Nansat):
                 except:
                     self.logger.error('%s is not in %s' % (b, n.fileName))
                 if a is not None:
-                    # insert data into result only for pixels masked
-                    # by the serial number of the input file
-                    avgMat[b][maxIndex == (i + 1)] = a[maxIndex == (i + 1)]
-
+                    # insert data into result only for pixels with
+                    # the latest data
+                    avgMat[b][gpi] = a[gpi]
+
+            # keep the latest image opened (for metadata)
+            if lastN is None or itimes[i] >= lastTime:
+                lastN = n
+                lastTime = itimes[i]
             # destroy input nansat 
             n = None
-        # keep last image opened
-        lastN = self._get_layer_image(f) 
+
+        if lastN is None:
+            self.logger.error('No valid input files!')
+            return
+
+        # sort times and convert serial numbers of files in the list into
+        # serial numbers of files sorted by time
+        ars = np.argsort(itimes, kind='mergesort')
+        sortedIndex = np.zeros(len(files) + 1, 'uint16')
+        sortedIndex[ars + 1] = np.arange(len(files)) + 1
+        maxIndex = sortedIndex[fileIndex]
 
         self.logger.debug('Adding bands')
         # add mask band
@@ -518,6 +790,9 @@ class Mosaic(Nansat):
         timeString = ''
         dt = datetime.datetime(1,1,1)
         for i in range(len(itimes)):
-            timeString += dt.fromordinal(int(itimes[ars[i]])).strftime('%Y-%m-%dZ%H:%M ')
+            itime = itimes[ars[i]]
+            timeString += (dt.fromordinal(int(itime)) +
+                           datetime.timedelta(itime - int(itime))
+                           ).strftime('%Y-%m-%dZ%H:%M ')
         # add band with mask of coverage of each frame
         self.add_band(array=maxIndex, parameters={'name': 'date_index', 'values': timeString})
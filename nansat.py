@@ -52,6 +52,26 @@ except ImportError:
     warnings.warn('Cannot import NansatOGR!'
                   'Nansat will not work.')
 
+try:
+    from warpindex import WarpIndex
+except ImportError:
+    warnings.warn('Cannot import WarpIndex!'
+                  'Nansat.reproject(warpIndex=...) will not work.')
+
+# registry of all live Nansat objects (see get_memory_usage())
+nansatRegistry = weakref.WeakKeyDictionary()
+
+def get_memory_usage():
+    '''Get size of VSI files and arrays kept by each live Nansat object
+
+    Returns
+    --------
+    memoryUsage : dict
+        Nansat object => size in bytes (see Nansat.get_memory_size())
+
+    '''
+    return dict([(n, n.get_memory_size()) for n in nansatRegistry.keys()])
+
 # Force GDAL to raise exceptions
 try:
     gdal.UseExceptions()
@@ -174,7 +194,8 @@ class Nansat(Domain):
         self.raw : Mapper(VRT) object
             set VRT object with VRT dataset with mapping of variables
         self.vrt : Mapper(VRT) object
-            Copy of self.raw
+            Current VRT object. It is self.raw itself until the image is
+            resized or reprojected (the copy is made only when needed)
         self.logger : logging.Logger
             logger for output debugging info
         self.name : string
@@ -190,18 +211,19 @@ class Nansat(Domain):
 
         # empty dict of VRTs with added bands
         self.addedBands = {}
+        # names of added bands with VRTs given by user (not owned by self)
+        self.externalBands = []
+
+        # register the object for accounting of memory
+        nansatRegistry[self] = True
 
         # add all available mappers if mapperName is not given
         self.mapper = 'None'
         self.mapperList = []
         if mapperName is '':
-            for folder in sys.path:
-                for mapper in glob.glob(folder + '/mapper_*.py'):
-                    self.mapperList.append(os.path.basename(mapper))
-
-            # pop and append generic mapper to the end
-            self.mapperList.pop(self.mapperList.index('mapper_generic.py'))
-            self.mapperList.append('mapper_generic.py')
+            # list of mappers is searched in sys.path only once and cached
+            # (see nansat_tools.get_mapper_list())
+            self.mapperList = get_mapper_list()
 
         self.logger.debug('Mappers: ' + str(self.mapperList))
 
@@ -215,14 +237,14 @@ class Nansat(Domain):
         if fileName != '':
             # Make original VRT object with mapping of variables
             self.raw = self._get_mapper(mapperName, **kwargs)
-            # Set current VRT object
-            self.vrt = self.raw.copy()
+            # Set current VRT object (shared with raw until modified)
+            self.vrt = self.raw
         # ...create using array, domain, and parameters
         else:
             # Get vrt from domain
             self.raw = VRT(gdalDataset=domain.vrt.dataset)
-            # Set current VRT object
-            self.vrt = VRT(gdalDataset=domain.vrt.dataset)
+            # Set current VRT object (shared with raw until modified)
+            self.vrt = self.raw
             if array is not None:
                 # add a band from array
                 self.add_band(array=array, parameters=parameters)
@@ -241,20 +263,11 @@ class Nansat(Domain):
 
         Returns
         --------
-        self.get_GDALRasterBand(bandID).ReadAsArray() : NumPy array
+        self.get_window(bandID) : NumPy array
+            the entire band
 
         '''
-        # get band
-        band = self.get_GDALRasterBand(bandID)
-        # get expression from metadata
-        expression = band.GetMetadata().get('expression', '')
-        # get data
-        bandData = band.ReadAsArray()
-        # execute expression if any
-        if expression != '':
-            bandData = eval(expression)
-
-        return bandData
+        return self.get_window(bandID)
 
     def __repr__(self):
         '''Creates string with basic info about the Nansat object'''
@@ -269,6 +282,71 @@ class Nansat(Domain):
         outString += Domain.__repr__(self)
         return outString
 
+    def __enter__(self):
+        ''' Allows using Nansat as context manager
+
+        Example
+        -------
+        with Nansat(fileName) as n:
+            n.export('output.nc')
+        # all VSI files of n are deleted here
+
+        '''
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        ''' Close the object at exit from the with-statement'''
+        self.close()
+
+    def close(self):
+        '''Delete all VSI files owned by the Nansat object
+
+        VSI files of self.vrt, self.raw, VRTs between them (created by
+        reproject() or resize()) and added bands (and of all helper VRTs
+        kept by them) are deleted immediately, without waiting for the
+        garbage collector. VRTs given to add_band(vrt=...) are not deleted.
+        The object cannot be used after close().
+
+        Modifies
+        ---------
+        self.vrt, self.raw are closed, self.addedBands is emptied
+
+        '''
+        for bandName in self.addedBands:
+            if bandName not in self.externalBands:
+                self.addedBands[bandName].close()
+        self.addedBands = {}
+        self.externalBands = []
+        # self.vrt and its sources up to self.raw
+        raw = getattr(self, 'raw', None)
+        vrt = getattr(self, 'vrt', None)
+        while vrt is not None and vrt is not raw:
+            srcVRT = getattr(vrt, 'srcVRT', None)
+            vrt.close()
+            vrt = srcVRT
+        if raw is not None:
+            raw.close()
+        nansatRegistry.pop(self, None)
+
+    def get_memory_size(self):
+        '''Get size of VSI files and arrays kept by the Nansat object
+
+        Returns
+        --------
+        memorySize : int
+            size in bytes of VRT and RAW files in /vsimem and arrays kept by
+            self.vrt, self.raw and added bands
+
+        '''
+        counted = set()
+        memorySize = 0
+        vrts = [getattr(self, 'vrt', None), getattr(self, 'raw', None)]
+        for vrt in vrts + self.addedBands.values():
+            if vrt is not None:
+                memorySize += vrt.get_memory_size(counted)
+
+        return memorySize
+
     def add_band(self, fileName=None, vrt=None, bandID=1, array=None,
                  parameters=None, resamplingAlg=1):
         '''Add band from the array to self.vrt
@@ -280,12 +358,17 @@ class Nansat(Domain):
         NB : Adding band is possible for raw (nonprojected, nonresized) images
         only. Adding band will cancel any previous reproject() or resize().
 
+        NB : The data of <array> is not copied (unless the array is spilled
+        to disk, see set_spill()): the band reads memory of the array, so
+        changes of the array after add_band() are visible in the band. Give
+        a copy (array.copy()) if the array will be modified.
+
         Parameters
         -----------
         fileName : string, name of the file, source of band
         vrt : VRT, source of band
         bandID : int, number of the band in fileName or in vrt
-        array : Numpy array with band data
+        array : Numpy array with band data (not copied)
         parameters : dictionary, band metadata: wkv, name, etc.
         resamplingAlg : 0, 1, 2 stands for nearest, bilinear, cubic
 
@@ -294,6 +377,62 @@ class Nansat(Domain):
         Creates VRT object with VRT-file and RAW-file
         Adds band to the self.vrt
 
+        See Also
+        ---------
+        Nansat.add_bands() for adding many bands at once
+
+        '''
+        self._add_band_to_raw(fileName, vrt, bandID, array, parameters,
+                              resamplingAlg)
+        self.raw.dataset.FlushCache()  # required after adding bands
+        # current vrt is raw VRT (no copy is needed)
+        self.vrt = self.raw
+
+    def add_bands(self, arrays, parameters=None, resamplingAlg=1):
+        '''Add several bands from arrays to self.vrt at once
+
+        Same as calling add_band(array=...) for each array, but the raw VRT
+        is flushed only once after all bands are added. Data of the arrays
+        is not copied (see add_band()).
+
+        Parameters
+        -----------
+        arrays : list of Numpy arrays with band data
+        parameters : list of dictionaries, band metadata: wkv, name, etc.
+            (one dictionary per array)
+        resamplingAlg : 0, 1, 2 stands for nearest, bilinear, cubic
+
+        Modifies
+        ---------
+        Creates VRT objects with VRT-file and RAW-file
+        Adds bands to the self.vrt
+
+        '''
+        if parameters is None:
+            parameters = [None] * len(arrays)
+        if len(parameters) != len(arrays):
+            raise OptionError('Number of parameters (%d) and arrays (%d) '
+                              'differ!' % (len(parameters), len(arrays)))
+
+        for array, p in zip(arrays, parameters):
+            self._add_band_to_raw(array=array, parameters=p,
+                                  resamplingAlg=resamplingAlg)
+        self.raw.dataset.FlushCache()  # required after adding bands
+        # current vrt is raw VRT (no copy is needed)
+        self.vrt = self.raw
+
+    def _add_band_to_raw(self, fileName=None, vrt=None, bandID=1, array=None,
+                         parameters=None, resamplingAlg=1):
+        '''Add band to self.raw without flushing the dataset
+
+        Parameters
+        -----------
+        see add_band()
+
+        Modifies
+        ---------
+        Adds band to self.raw and VRT with the band to self.addedBands
+
         '''
         # None => {} in input p
         if parameters is None:
@@ -348,9 +487,8 @@ class Nansat(Domain):
         # add VRT with the band to the dictionary
         # (not to loose the VRT object and VRT file in memory)
         self.addedBands[bandName] = vrt2add
-        self.raw.dataset.FlushCache()  # required after adding bands
-        # copy raw VRT object to the current vrt
-        self.vrt = self.raw.copy()
+        if vrt is not None:
+            self.externalBands.append(bandName)
 
     def bands(self):
         ''' Make a dictionary with all bands metadata
@@ -361,14 +499,16 @@ class Nansat(Domain):
             key = N, value = dict with all band metadata
 
         '''
+        bandsMeta = self.vrt.get_bands_index()[0]
         b = {}
-        for iBand in range(self.vrt.dataset.RasterCount):
-            b[iBand + 1] = self.get_metadata(bandID=iBand + 1)
+        for iBand in bandsMeta:
+            b[iBand] = dict(bandsMeta[iBand])
 
         return b
 
     def export(self, fileName, rmMetadata=[], addGeolocArray=True,
-               addGCPs=True, driver='netCDF'):
+               addGCPs=True, driver='netCDF', streaming=False, callback=None,
+               cacheSize=None):
         '''Export Nansat object into netCDF or GTiff file
 
         Parameters
@@ -379,6 +519,15 @@ class Nansat(Domain):
         addGeolocArray : Boolean, add geolocation array datasets? [True].
         addGCPs : Boolean, add GCPs? [True]
         driver : Which GDAL driver (format) to use [netCDF]
+        streaming : Boolean, export with bounded memory? [False]
+            Real and imaginary parts of complex bands are computed by
+            pixel functions block by block, instead of reading the entire
+            complex bands into memory. Bands with metadata 'expression'
+            are still read entirely.
+        callback : function, progress callback for GDAL [None]
+            e.g. gdal.TermProgress or func(complete, message, data)
+        cacheSize : int, size of GDAL block cache in MB during export [None]
+            By default the current GDAL cache size is used
 
         Modifies
         ---------
@@ -425,16 +574,33 @@ class Nansat(Domain):
                 bandMetadataI = bandMetadataR.copy()
                 bandMetadataR['name'] = bandMetadataR.pop('name')+'_real'
                 bandMetadataI['name'] = bandMetadataI.pop('name')+'_imag'
-                # Create bands from the real and imaginary numbers
-                exportVRT.real.append(VRT(array=self[i].real))
-                exportVRT.imag.append(VRT(array=self[i].imag))
-
-                metaDict = [{'src': {'SourceFilename': exportVRT.real[-1].fileName,
-                             'SourceBand':  1},
-                             'dst': bandMetadataR},
-                            {'src': {'SourceFilename': exportVRT.imag[-1].fileName,
-                             'SourceBand':  1},
-                             'dst': bandMetadataI}]
+                if streaming and 'expression' not in bandMetadataR:
+                    # Create bands with pixel functions which take real and
+                    # imaginary parts from the complex band block by block
+                    dataType = self._get_raster_band(i).DataType
+                    dataType = {gdal.GDT_CInt16: gdal.GDT_Int16,
+                                gdal.GDT_CInt32: gdal.GDT_Int32,
+                                gdal.GDT_CFloat32: gdal.GDT_Float32,
+                                gdal.GDT_CFloat64: gdal.GDT_Float64
+                                }.get(dataType, gdal.GDT_Float32)
+                    bandMetadataR['PixelFunctionType'] = 'real'
+                    bandMetadataI['PixelFunctionType'] = 'imag'
+                    bandMetadataR['dataType'] = dataType
+                    bandMetadataI['dataType'] = dataType
+                    srcR = {'SourceFilename': self.vrt.fileName,
+                            'SourceBand': i}
+                    srcI = dict(srcR)
+                else:
+                    # Create bands from the real and imaginary numbers
+                    exportVRT.real.append(VRT(array=self[i].real))
+                    exportVRT.imag.append(VRT(array=self[i].imag))
+                    srcR = {'SourceFilename': exportVRT.real[-1].fileName,
+                            'SourceBand':  1}
+                    srcI = {'SourceFilename': exportVRT.imag[-1].fileName,
+                            'SourceBand':  1}
+
+                metaDict = [{'src': srcR, 'dst': bandMetadataR},
+                            {'src': srcI, 'dst': bandMetadataI}]
                 exportVRT._create_bands(metaDict)
             # delete the complex bands
             exportVRT.delete_bands(complexBands)
@@ -496,10 +662,22 @@ class Nansat(Domain):
                 self.logger.info('Global metadata %s not found' % rmMeta)
         exportVRT.dataset.SetMetadata(globMetadata)
 
+        # set size of GDAL cache (in bytes) for the export
+        if cacheSize is not None:
+            oldCacheSize = gdal.GetCacheMax()
+            gdal.SetCacheMax(int(cacheSize * 1024 * 1024))
+
         # Create an output file using GDAL
+        # (bands are copied block by block by the GDAL driver)
         self.logger.debug('Exporting to %s using %s...' % (fileName, driver))
-        dataset = gdal.GetDriverByName(driver).CreateCopy(fileName,
-                                                          exportVRT.dataset)
+        try:
+            dataset = gdal.GetDriverByName(driver).CreateCopy(
+                                                        fileName,
+                                                        exportVRT.dataset,
+                                                        callback=callback)
+        finally:
+            if cacheSize is not None:
+                gdal.SetCacheMax(oldCacheSize)
         self.logger.debug('Export - OK!')
 
     def resize(self, factor=1, width=None, height=None, eResampleAlg=-1):
@@ -544,7 +722,7 @@ class Nansat(Domain):
 
         # resize back to original size/setting
         if factor == 1 and width is None and height is None:
-            self.vrt = self.raw.copy()
+            self.vrt = self.raw
             return
 
         # get current shape
@@ -571,6 +749,9 @@ class Nansat(Domain):
                                         eResampleAlg=eResampleAlg)
         else:
             # simply modify VRT rasterX/Ysize and GCPs
+            # (in a copy, if self.vrt is shared with self.raw)
+            if self.vrt is self.raw:
+                self.vrt = self.raw.copy()
             # Get XML content from VRT-file
             vrtXML = self.vrt.read_xml()
             node0 = Node.create(vrtXML)
@@ -616,6 +797,10 @@ class Nansat(Domain):
         If int is given check if band with this number exists.
         Get a GDALRasterBand from vrt.
 
+        The band can be modified by the caller (e.g. band.SetMetadataItem()),
+        therefore the index of band metadata (see VRT.get_bands_index()) is
+        reset. Get the band again after changing its metadata later.
+
         Parameters
         -----------
         bandID : serial number or string, optional (default is 1)
@@ -631,12 +816,306 @@ class Nansat(Domain):
         b = n.get_GDALRasterBand(1)
         b = n.get_GDALRasterBand('sigma0')
 
+        '''
+        band = self._get_raster_band(bandID)
+        self.vrt._reset_bands_index()
+        return band
+
+    def _get_raster_band(self, bandID=1):
+        ''' Get a GDALRasterBand for reading, keep the index of bands
+
+        See get_GDALRasterBand(). The band should not be modified.
+
         '''
         # get band number
         bandNumber = self._get_band_number(bandID)
+        # add data to the band if it is computed on demand
+        self.vrt.load_lazy_bands([bandNumber])
         # the GDAL RasterBand of the corresponding band is returned
         return self.vrt.dataset.GetRasterBand(bandNumber)
 
+    def get_window(self, bandID=1, xOff=0, yOff=0, xSize=None, ySize=None,
+                   bufXSize=None, bufYSize=None):
+        ''' Read a window of a band as a NumPy array
+
+        Only the given window is read from the file. If the band has
+        metadata 'expression', it is applied to the window.
+
+        Parameters
+        -----------
+        bandID : int or str, optional (default is 1)
+            number or name of the band
+        xOff, yOff : int, optional (default is 0)
+            pixel and line of the upper left corner of the window
+        xSize, ySize : int, optional
+            width and height of the window. Default is until the end of
+            the band
+        bufXSize, bufYSize : int, optional
+            width and height of the output array. If given, the window is
+            resampled (by GDAL) to that size. Default is xSize, ySize
+
+        Returns
+        --------
+        bandData : NumPy array
+            data from the window
+
+        Example
+        -------
+        a = n.get_window('sigma0', 1000, 2000, 500, 500)
+        a = n.get_window(1, bufXSize=100, bufYSize=100) # overview
+
+        '''
+        # get band
+        band = self._get_raster_band(bandID)
+
+        # check the window
+        if xSize is None:
+            xSize = band.XSize - xOff
+        if ySize is None:
+            ySize = band.YSize - yOff
+        if (xOff < 0 or yOff < 0 or xSize <= 0 or ySize <= 0 or
+                xOff + xSize > band.XSize or yOff + ySize > band.YSize):
+            raise OptionError('Window (%d, %d, %d, %d) is outside the band '
+                              '(%d x %d)!' % (xOff, yOff, xSize, ySize,
+                                              band.XSize, band.YSize))
+        if bufXSize is None:
+            bufXSize = xSize
+        if bufYSize is None:
+            bufYSize = ySize
+
+        # get expression from metadata
+        expression = band.GetMetadata().get('expression', '')
+        # get data
+        bandData = band.ReadAsArray(xOff, yOff, xSize, ySize,
+                                    bufXSize, bufYSize)
+        # execute expression if any
+        if expression != '':
+            bandData = eval(expression)
+
+        return bandData
+
+    def get_bands(self, bandIDs, xOff=0, yOff=0, xSize=None, ySize=None):
+        ''' Read several bands (or their windows) as one 3D NumPy array
+
+        All bands are read from the dataset with one call to GDAL (one I/O
+        pass over the sources). If the bands have different data types,
+        the common type is used. If a band has metadata 'expression', it is
+        applied to the data of this band.
+
+        Parameters
+        -----------
+        bandIDs : list of int or str
+            numbers or names of the bands
+        xOff, yOff, xSize, ySize : int, optional
+            window to read (see get_window())
+
+        Returns
+        --------
+        bandsData : NumPy array
+            data from the bands, shape is (len(bandIDs), ySize, xSize)
+
+        Example
+        -------
+        rgb = n.get_bands(['L_645', 'L_555', 'L_469'])
+
+        '''
+        bandNumbers = [self._get_band_number(bandID) for bandID in bandIDs]
+        self.vrt.load_lazy_bands(bandNumbers)
+
+        # check the window
+        if xSize is None:
+            xSize = self.vrt.dataset.RasterXSize - xOff
+        if ySize is None:
+            ySize = self.vrt.dataset.RasterYSize - yOff
+        if (xOff < 0 or yOff < 0 or xSize <= 0 or ySize <= 0 or
+                xOff + xSize > self.vrt.dataset.RasterXSize or
+                yOff + ySize > self.vrt.dataset.RasterYSize):
+            raise OptionError('Window (%d, %d, %d, %d) is outside the bands '
+                              '(%d x %d)!' % (xOff, yOff, xSize, ySize,
+                                              self.vrt.dataset.RasterXSize,
+                                              self.vrt.dataset.RasterYSize))
+
+        # find common data type of all bands
+        gdal2numpy = {'Byte': 'uint8',
+                      'UInt16': 'uint16',
+                      'Int16': 'int16',
+                      'UInt32': 'uint32',
+                      'Int32': 'int32',
+                      'Float32': 'float32',
+                      'Float64': 'float64',
+                      'CFloat32': 'complex64',
+                      'CFloat64': 'complex128'}
+        numpy2gdal = dict([(v, k) for k, v in gdal2numpy.items()])
+        dtypes = [gdal2numpy.get(gdal.GetDataTypeName(
+                  self.vrt.dataset.GetRasterBand(bandNumber).DataType),
+                  'float64') for bandNumber in bandNumbers]
+        dtype = np.result_type(*dtypes).name
+        if dtype not in numpy2gdal:
+            dtype = 'float64'
+
+        # read all bands at once
+        bandsData = np.fromstring(self.vrt.dataset.ReadRaster(
+                                  xOff, yOff, xSize, ySize, xSize, ySize,
+                                  gdal.GetDataTypeByName(numpy2gdal[dtype]),
+                                  bandNumbers), dtype)
+        bandsData = bandsData.reshape(len(bandNumbers), ySize, xSize)
+
+        # execute expressions if any
+        bandsMeta = self.vrt.get_bands_index()[0]
+        expressions = [bandsMeta[bandNumber].get('expression', '')
+                       for bandNumber in bandNumbers]
+        if any(expressions):
+            bandsData = list(bandsData)
+            for i, expression in enumerate(expressions):
+                if expression != '':
+                    bandData = bandsData[i]
+                    bandsData[i] = eval(expression)
+            bandsData = np.array(bandsData)
+
+        return bandsData
+
+    def read_bands(self, bandIDs, blockSize=None):
+        ''' Read several bands sharing reading of sources of derived bands
+
+        Derived bands (VRTDerivedRasterBand with pixel function, e.g.
+        sigma0 and incidence angle of SAR mappers) often have the same
+        sources. Here the bands are read block by block (full rows); in
+        each block every distinct source is read only once and all the
+        requested derived bands are computed (by the same pixel functions)
+        from these data in memory. Other bands are read as usual. If a band
+        has metadata 'expression', it is applied to the data of this band.
+
+        Parameters
+        -----------
+        bandIDs : list of int or str
+            numbers or names of the bands
+        blockSize : int, optional
+            number of lines in one block. Default is the block height of
+            the first band
+
+        Returns
+        --------
+        bandsData : list of NumPy arrays
+            data from each band
+
+        Example
+        -------
+        sigma0, ice, water = n.read_bands(['sigma0',
+                                           'sigma0_normalized_ice',
+                                           'sigma0_normalized_water'])
+
+        '''
+        bandNumbers = [self._get_band_number(bandID) for bandID in bandIDs]
+        self.vrt.load_lazy_bands(bandNumbers)
+        derivedBands = self.vrt.get_derived_bands(bandNumbers)
+        derivedNumbers = sorted(derivedBands.keys())
+
+        # create one VRT for each distinct source of all derived bands
+        # (sources are read in their native data type)
+        srcVRTs = OrderedDict()
+        derivedList = []
+        for bandNumber in derivedNumbers:
+            (pixelFunctionType, dataType,
+             sourceTransferType, srcs) = derivedBands[bandNumber]
+            for srcXML, srcDataType in srcs:
+                if srcXML not in srcVRTs:
+                    srcVRTs[srcXML] = self.vrt.create_source_vrt(srcXML,
+                                                                 srcDataType)
+            derivedList.append((pixelFunctionType, dataType,
+                                sourceTransferType,
+                                [srcXML for srcXML, srcDataType in srcs]))
+        self.logger.debug('Read %d bands, %d derived bands, %d sources'
+                          % (len(bandNumbers), len(derivedNumbers),
+                             len(srcVRTs)))
+
+        xSize = self.vrt.dataset.RasterXSize
+        ySize = self.vrt.dataset.RasterYSize
+        bands = [self.vrt.dataset.GetRasterBand(bandNumber)
+                 for bandNumber in bandNumbers]
+        if blockSize is None:
+            blockSize = bands[0].GetBlockSize()[1]
+
+        bandsData = [None] * len(bandNumbers)
+        for yOff in range(0, ySize, blockSize):
+            yBlock = min(blockSize, ySize - yOff)
+            # read each source once and compute all derived bands
+            blockData = {}
+            if len(srcVRTs) > 0:
+                arrayVRTs = {}
+                for srcXML in srcVRTs:
+                    srcBand = srcVRTs[srcXML].dataset.GetRasterBand(1)
+                    arrayVRTs[srcXML] = VRT(array=srcBand.ReadAsArray(
+                                            0, yOff, xSize, yBlock))
+                derivedVRT = self.vrt.create_derived_vrt(derivedList,
+                                                         arrayVRTs)
+                for i, bandNumber in enumerate(derivedNumbers):
+                    blockData[bandNumber] = derivedVRT.dataset.GetRasterBand(
+                                                        i + 1).ReadAsArray()
+
+            # read other bands and put data into output arrays
+            for i, bandNumber in enumerate(bandNumbers):
+                if bandNumber in blockData:
+                    bandData = blockData[bandNumber]
+                else:
+                    bandData = bands[i].ReadAsArray(0, yOff, xSize, yBlock)
+                if bandsData[i] is None:
+                    bandsData[i] = np.zeros((ySize, xSize), bandData.dtype)
+                bandsData[i][yOff:yOff + yBlock] = bandData
+
+        # execute expressions if any
+        bandsMeta = self.vrt.get_bands_index()[0]
+        for i, bandNumber in enumerate(bandNumbers):
+            expression = bandsMeta[bandNumber].get('expression', '')
+            if expression != '':
+                bandData = bandsData[i]
+                bandsData[i] = eval(expression)
+
+        return bandsData
+
+    def iterate_blocks(self, bandID=1, tileSize=None):
+        ''' Iterate over tiles of a band aligned to the GDAL blocks
+
+        Band is read tile by tile, so that large bands can be processed
+        without reading the entire band into memory.
+
+        Parameters
+        -----------
+        bandID : int or str, optional (default is 1)
+            number or name of the band
+        tileSize : list of two ints, optional
+            width and height of tiles. Default is the block size of the band.
+            Tiles are rounded up to a whole number of blocks
+
+        Yields
+        -------
+        xOff, yOff, bandData : int, int, NumPy array
+            pixel and line of the upper left corner of the tile and data
+            from the tile (see get_window()). Tiles at the right and bottom
+            edges can be smaller.
+
+        Example
+        -------
+        for xOff, yOff, tile in n.iterate_blocks('sigma0', [4096, 512]):
+            outArray[yOff:yOff + tile.shape[0],
+                     xOff:xOff + tile.shape[1]] = tile > 0.1
+
+        '''
+        # find band number only once
+        bandNumber = self._get_band_number(bandID)
+        band = self._get_raster_band(bandNumber)
+        xBlock, yBlock = band.GetBlockSize()
+        if tileSize is not None:
+            # round up to whole number of blocks
+            xBlock *= max(1, int(np.ceil(tileSize[0] / float(xBlock))))
+            yBlock *= max(1, int(np.ceil(tileSize[1] / float(yBlock))))
+
+        for yOff in range(0, band.YSize, yBlock):
+            ySize = min(yBlock, band.YSize - yOff)
+            for xOff in range(0, band.XSize, xBlock):
+                xSize = min(xBlock, band.XSize - xOff)
+                yield xOff, yOff, self.get_window(bandNumber, xOff, yOff,
+                                                  xSize, ySize)
+
     def list_bands(self, doPrint=True):
         ''' Show band information of the given Nansat object
 
@@ -671,7 +1150,8 @@ class Nansat(Domain):
             return outString
 
     def reproject(self, dstDomain=None, eResampleAlg=0, blockSize=None,
-                  WorkingDataType=None, tps=False):
+                  WorkingDataType=None, tps=False, warpIndex=None,
+                  gcpTolerance=0.5):
         ''' Reproject the object based on the given Domain
 
         Warp the raw VRT using AutoCreateWarpedVRT() using projection
@@ -689,6 +1169,21 @@ class Nansat(Domain):
             2 : Cubic,
             3 : CubicSpline
             4 : Lancoz
+        warpIndex : WarpIndex or True or None
+            If given, bands are resampled with NumPy using precomputed
+            source pixel/line of each destination pixel (see WarpIndex)
+            instead of GDAL warping (only nearest neighbour (0) and
+            bilinear (other eResampleAlg)). Each band is resampled when it
+            is read for the first time.
+            If True, the index is taken from dstDomain.warpIndex (if it
+            fits the geo-reference of self) or computed and kept in
+            dstDomain.warpIndex
+        tps : bool
+            use thin plate splines for GCPs (instead of polynomial)
+        gcpTolerance : float or None
+            if tps is True, only the smallest subset of GCPs which fits all
+            GCPs with this error (pixels) is used for warping. The number
+            of GCPs and the achieved error are kept in self.vrt.gcpReport
 
         Modifies
         ---------
@@ -701,7 +1196,7 @@ class Nansat(Domain):
 
         '''
         # dereproject
-        self.vrt = self.raw.copy()
+        self.vrt = self.raw
 
         # if no domain: quit
         if dstDomain is None:
@@ -716,8 +1211,24 @@ class Nansat(Domain):
             # get projection of destination GCPs
             dstSRS = dstDomain.vrt.dataset.GetGCPProjection()
 
-        # create Warped VRT
-        warpedVRT = self.raw.create_warped_vrt(
+        if warpIndex is True:
+            # get index from the domain or compute new one
+            warpIndex = getattr(dstDomain, 'warpIndex', None)
+            if warpIndex is None or not warpIndex.fits(self.raw, dstDomain):
+                warpIndex = WarpIndex(self.raw, dstDomain, tps=tps,
+                                      logLevel=self.logger.level)
+                dstDomain.warpIndex = warpIndex
+
+        if warpIndex is not None:
+            # resample bands using precomputed index
+            if not warpIndex.fits(self.raw, dstDomain,
+                                  sameGeoreference=False):
+                raise OptionError('Warp index does not fit the shapes of '
+                                  'the image and the Domain!')
+            warpedVRT = warpIndex.warp_vrt(self.raw, dstDomain, eResampleAlg)
+        else:
+            # create Warped VRT
+            warpedVRT = self.raw.create_warped_vrt(
                     dstSRS=dstSRS, dstGCPs=dstGCPs,
                     eResampleAlg=eResampleAlg,
                     xSize=dstDomain.vrt.dataset.RasterXSize,
@@ -725,7 +1236,7 @@ class Nansat(Domain):
                     blockSize=blockSize,
                     geoTransform=dstDomain.vrt.dataset.GetGeoTransform(),
                     WorkingDataType=WorkingDataType,
-                    tps=tps)
+                    tps=tps, gcpTolerance=gcpTolerance)
 
         # set current VRT object
         self.vrt = warpedVRT
@@ -1035,7 +1546,7 @@ class Nansat(Domain):
             caption = kwargs['caption']
         else:
             # get longName and units from vrt
-            band = self.get_GDALRasterBand(bands[0])
+            band = self._get_raster_band(bands[0])
             longName = band.GetMetadata().get('long_name', '')
             units = band.GetMetadata().get('units', '')
 
@@ -1109,7 +1620,7 @@ class Nansat(Domain):
 
         '''
         bandNo = self._get_band_number(bandID)
-        band = self.get_GDALRasterBand(bandID)
+        band = self._get_raster_band(bandID)
         minmax = band.GetMetadataItem('minmax')
         # Get min and max from band histogram if not given (from wkv)
         if minmax is None:
@@ -1372,11 +1883,10 @@ class Nansat(Domain):
 
         '''
         time = []
+        bandsMeta = self.vrt.get_bands_index()[0]
         for i in range(self.vrt.dataset.RasterCount):
-            band = self.get_GDALRasterBand(i + 1)
             try:
-                time.append(dateutil.parser.parse(
-                            band.GetMetadataItem('time')))
+                time.append(dateutil.parser.parse(bandsMeta[i + 1]['time']))
             except:
                 self.logger.debug('Band ' + str(i + 1) + ' has no time')
                 time.append(None)
@@ -1409,7 +1919,7 @@ class Nansat(Domain):
         if bandID is None:
             metadata = self.vrt.dataset.GetMetadata()
         else:
-            metadata = self.get_GDALRasterBand(bandID).GetMetadata()
+            metadata = self._get_raster_band(bandID).GetMetadata()
 
         # get all metadata or from a key
         if key is not None:
@@ -1445,6 +1955,9 @@ class Nansat(Domain):
 
             metaReceiverRAW = self.raw.dataset.GetRasterBand(bandNumber)
             metaReceiverVRT = self.vrt.dataset.GetRasterBand(bandNumber)
+            # band metadata is changed: forget index of bands
+            self.raw._reset_bands_index()
+            self.vrt._reset_bands_index()
 
         # set metadata from dictionary or from single pair key,value
         if type(key) == dict:
@@ -1461,6 +1974,9 @@ class Nansat(Domain):
         If mapperName is given only this mapper will be used,
         else loop over all availble mappers in mapperList to get the
         matching one.
+        Mappers which declare a signature (Mapper.signature) are tested
+        only if the GDAL driver, metadata, file name or file header match
+        the signature (see nansat_tools.match_signature()).
         In the loop :
             If the specific error appears the mapper is not used
             and the next mapper is tested.
@@ -1504,20 +2020,38 @@ class Nansat(Domain):
             mapperName = mapperName.replace('mapper_',
                                             '').replace('.py', '').lower()
             try:
-                mapper_module = __import__('mapper_' + mapperName)
+                mapper_module = import_mapper('mapper_' + mapperName)
             except ImportError:
                 raise Error('Mapper ' + mapperName + ' not in PYTHONPATH')
             tmpVRT = mapper_module.Mapper(self.fileName, gdalDataset,
                                           metadata, **kwargs)
             self.mapper = mapperName
         else:
-            # We test all mappers, import one by one
+            # get cheap probes of the input file
+            driverName = ''
+            if gdalDataset is not None:
+                driverName = gdalDataset.GetDriver().ShortName
+            header = read_file_header(self.fileName)
+
+            # select mappers for the GDAL driver from the index
+            mapperIndex = get_mapper_index(self.mapperList)
+            driverMappers = (mapperIndex['drivers'].get(driverName, []) +
+                             mapperIndex['any'])
+
+            # We test only mappers with matching signature, import one by one
             for iMapper in self.mapperList:
                 #get rid of .py extension
                 iMapper = iMapper.replace('.py', '')
+                if iMapper not in driverMappers:
+                    continue
+                if not match_signature(mapperIndex['signatures'][iMapper],
+                                       self.fileName, driverName,
+                                       metadata, header):
+                    self.logger.debug('Skipping %s...' % iMapper)
+                    continue
                 self.logger.debug('Trying %s...' % iMapper)
                 try:
-                    mapper_module = __import__(iMapper)
+                    mapper_module = import_mapper(iMapper)
                     #create a Mapper object and get VRT dataset from it
                     tmpVRT = mapper_module.Mapper(self.fileName, gdalDataset,
                                                   metadata, **kwargs)
@@ -1567,14 +2101,13 @@ class Nansat(Domain):
 
         '''
         bandNumber = 0
-        # if bandID is str: create simple dict with seraching criteria
-        searchDict = None
+        # if bandID is str: find band number in the index of band names
         if type(bandID) == str:
-            bandID = {'name': bandID}
+            bandNumber = self.vrt.get_bands_index()[1].get(bandID, 0)
 
-        # if bandID is dict: search self.bands with seraching criteria
+        # if bandID is dict: search index of bands with seraching criteria
         if type(bandID) == dict:
-            bandsMeta = self.bands()
+            bandsMeta = self.vrt.get_bands_index()[0]
             for b in bandsMeta:
                 for key in bandID:
                     if (key in bandsMeta[b] and
@@ -1651,16 +2184,11 @@ class Nansat(Domain):
         dstShape = self.shape()
         self.logger.debug('dstShape: %s' % str(dstShape))
 
-        # preallocate 2D matrices for sum, sum of squares, count of products
-        # and mask
+        # preallocate accumulators of statistics and mask
         self.logger.debug('Allocating 2D matrices')
-        avgMat = {}
-        stdMat = {}
+        accMat = {}
         for b in bands:
-            avgMat[b] = np.zeros((dstShape[0], dstShape[1]))
-            stdMat[b] = np.zeros((dstShape[0], dstShape[1]))
-
-        cntMat = np.zeros((dstShape[0], dstShape[1]), 'float16')
+            accMat[b] = Accumulator(dstShape)
         maskMat = np.zeros((2, dstShape[0], dstShape[1]), 'int8')
 
         # for all input files
@@ -1702,17 +2230,13 @@ class Nansat(Domain):
                 self.logger.error('No mask in reprojected file %s!' % f)
                 mask = np.zeros(n.shape()).astype('int8')
 
-            # add data to counting matrix
-            cntMatTmp = np.zeros((dstShape[0], dstShape[1]), 'float16')
-            cntMatTmp[mask > 2] = 1
-            cntMat += cntMatTmp
             # add data to mask matrix (maximum of 0, 1, 2, 64)
             maskMat[0, :, :] = mask
             maskMat[1, :, :] = maskMat.max(0)
 
-            # add data to summation matrix
+            # add data to accumulators
             for b in bands:
-                self.logger.debug('    Adding %s to sum' % b)
+                self.logger.debug('    Adding %s to statistics' % b)
                 # get projected data from Nansat object
                 a = None
                 try:
@@ -1720,28 +2244,18 @@ class Nansat(Domain):
                 except:
                     self.logger.error('%s is not in %s' % (b, n.fileName))
                 if a is not None:
-                    # mask invalid data
-                    a[mask <= 2] = 0
-                    # sum of valid values and squares
-                    avgMat[b] += a
-                    stdMat[b] += np.square(a)
+                    # add only valid data
+                    accMat[b].add(a, mask > 2)
             # destroy
             n = None
 
         # average products
-        cntMat[cntMat == 0] = np.nan
+        avgMat = {}
+        stdMat = {}
         for b in bands:
             self.logger.debug('    Averaging %s' % b)
-            # get average
-            avg = avgMat[b] / cntMat
-            # calculate STD
-            # STD = sqrt(sum((x-M)^2)/n) = (sqrt((sum(x^2) -
-            #                                2*mean(x)*sum(x) +
-            #                                sum(mean(x)^2))/n))
-            stdMat[b] = np.sqrt((stdMat[b] - 2.0 * avg * avgMat[b] +
-                                np.square(avg) * cntMat) / cntMat)
-            # set std
-            avgMat[b] = avg
+            avgMat[b] = accMat[b].get_mean()
+            stdMat[b] = accMat[b].get_std()
 
         # calculate mask (max of 0, 1, 2, 64)
         maskMat = maskMat.max(0)
@@ -1768,7 +2282,8 @@ class Nansat(Domain):
     def process(self, opts=None):
         '''Default L2 processing of Nansat object. Overloaded in childs.'''
 
-    def export_band(self, fileName, bandID=1, driver='netCDF'):
+    def export_band(self, fileName, bandID=1, driver='netCDF',
+                    streaming=False, callback=None, cacheSize=None):
         '''Export only one band of the Nansat object
         Get array from the required band
         Create temporary Nansat from the array
@@ -1782,20 +2297,35 @@ class Nansat(Domain):
             number of name of the band
         driver : str, ['netCDF']
             name of the GDAL Driver (format) to use
+        streaming : bool, [False]
+            don't read the band into memory: temporary Nansat refers to the
+            band in self.vrt and the band is copied block by block
+            (not possible for bands with metadata 'expression')
+        callback : function, [None]
+            progress callback for GDAL (see export())
+        cacheSize : int, [None]
+            size of GDAL block cache in MB during export (see export())
 
         '''
-        # get array from self
-        bandArray = self[bandID]
         # get root, band metadata
         rootMetadata = self.get_metadata()
         bandMetadata = self.get_metadata(bandID=bandID)
-        # create temporary nansat
-        tmpNansat = Nansat(domain=self, array=bandArray)
+        if streaming and 'expression' not in bandMetadata:
+            # create temporary nansat with reference to the band in self
+            tmpNansat = Nansat(domain=self)
+            tmpNansat.add_band(vrt=self.vrt,
+                               bandID=self._get_band_number(bandID))
+        else:
+            # get array from self
+            bandArray = self[bandID]
+            # create temporary nansat
+            tmpNansat = Nansat(domain=self, array=bandArray)
         # set metadata
         tmpNansat.set_metadata(rootMetadata)
         tmpNansat.set_metadata(bandMetadata, bandID=1)
         # export
-        tmpNansat.export(fileName, driver=driver)
+        tmpNansat.export(fileName, driver=driver, streaming=streaming,
+                         callback=callback, cacheSize=cacheSize)
 
     def get_transect(self, points=None, bandList=[1], latlon=True, transect=True, returnOGR=False, layerNum=0):
         '''Get transect from two poins and retun the values by numpy array
@@ -1878,6 +2408,7 @@ class Nansat(Domain):
 
         # convert pix/lin into lon/lat
         lonVector, latVector = self._transform_points(pixlinCoord[0], pixlinCoord[1], DstToSrc=0)
+        lonVector, latVector = lonVector.tolist(), latVector.tolist()
 
         transect = []
         # get data
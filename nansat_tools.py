@@ -38,9 +38,18 @@ import glob
 import inspect
 import pdb
 import sys
+import weakref
 
 ## used in vrt
+import atexit
+import base64
+import json
+import zlib
 import datetime
+import shutil
+import tempfile
+import hashlib
+from collections import OrderedDict
 from dateutil.parser import parse
 from random import choice
 from string import Template, ascii_uppercase, digits
@@ -480,6 +489,254 @@ class Node(object):
         return node
 
 
+class Accumulator(object):
+    '''Accumulator of statistics of 2D fields (count, mean, STD, min, max)
+
+    Fields are added one by one with the Welford algorithm, which does not
+    accumulate raw sums of squares and is numerically stable (e.g. for SST
+    in Kelvin). Accumulators from several subsets of fields (e.g. from
+    different processes) are merged with the parallel algorithm of Chan et
+    al. Count is kept as uint32, mean, M2 (sum of squared deviations from
+    the mean), min and max as <dtype>.
+
+    Example
+    -------
+    acc = Accumulator(n.shape())
+    for f in files:
+        acc.add(Nansat(f)['sst'])
+    sstMean = acc.get_mean()
+    sstStd = acc.get_std()
+
+    '''
+    def __init__(self, shape, dtype='float32'):
+        '''Create accumulator with empty statistics
+
+        Parameters
+        -----------
+        shape : tuple
+            shape of the 2D fields
+        dtype : str
+            data type of mean, M2, min and max
+
+        '''
+        self.count = np.zeros(shape, 'uint32')
+        self.mean = np.zeros(shape, dtype)
+        self.m2 = np.zeros(shape, dtype)
+        self.min = np.zeros(shape, dtype) + np.inf
+        self.max = np.zeros(shape, dtype) - np.inf
+
+    def add(self, data, mask=None):
+        '''Add a field to the statistics
+
+        Parameters
+        -----------
+        data : 2D numpy array
+            field with the same shape as the accumulator
+        mask : 2D boolean numpy array, optional
+            True for valid pixels. NaN and Inf are never added.
+
+        Modifies
+        ---------
+        self.count, self.mean, self.m2, self.min, self.max
+
+        '''
+        gpi = np.isfinite(data)
+        if mask is not None:
+            gpi &= np.asarray(mask, 'bool')
+        data = data[gpi].astype('float64')
+
+        count = self.count[gpi] + 1
+        delta = data - self.mean[gpi]
+        mean = self.mean[gpi] + delta / count
+        self.m2[gpi] += delta * (data - mean)
+        self.mean[gpi] = mean
+        self.count[gpi] = count
+        self.min[gpi] = np.minimum(self.min[gpi], data)
+        self.max[gpi] = np.maximum(self.max[gpi], data)
+
+    def merge(self, other):
+        '''Merge statistics from another accumulator
+
+        Parameters
+        -----------
+        other : Accumulator
+            accumulator of the same shape
+
+        Modifies
+        ---------
+        self.count, self.mean, self.m2, self.min, self.max
+
+        '''
+        gpi = other.count > 0
+        countA = self.count[gpi].astype('float64')
+        countB = other.count[gpi].astype('float64')
+        count = countA + countB
+        delta = other.mean[gpi] - self.mean[gpi].astype('float64')
+
+        self.mean[gpi] += delta * countB / count
+        self.m2[gpi] += (other.m2[gpi] +
+                         np.square(delta) * countA * countB / count)
+        self.count[gpi] += other.count[gpi]
+        self.min[gpi] = np.minimum(self.min[gpi], other.min[gpi])
+        self.max[gpi] = np.maximum(self.max[gpi], other.max[gpi])
+
+    def _get_valid(self, stat):
+        '''Return copy of statistics with NaN where count is 0'''
+        stat = stat.copy()
+        stat[self.count == 0] = np.nan
+        return stat
+
+    def get_count(self):
+        '''Return number of added values in each pixel'''
+        return self.count.copy()
+
+    def get_mean(self):
+        '''Return mean, NaN where no values were added'''
+        return self._get_valid(self.mean)
+
+    def get_std(self, ddof=0):
+        '''Return standard deviation, NaN where no values were added
+
+        Parameters
+        -----------
+        ddof : int
+            delta degrees of freedom, STD = sqrt(M2 / (count - ddof))
+
+        '''
+        std = self._get_valid(self.m2)
+        gpi = self.count > ddof
+        std[gpi] = np.sqrt(np.maximum(std[gpi], 0) /
+                           (self.count[gpi] - ddof))
+        std[~gpi] = np.nan
+        return std
+
+    def get_min(self):
+        '''Return minimum, NaN where no values were added'''
+        return self._get_valid(self.min)
+
+    def get_max(self):
+        '''Return maximum, NaN where no values were added'''
+        return self._get_valid(self.max)
+
+def latlon2gcps(lat, lon, rowIndices, colIndices, lineStep=1, pixelStep=1,
+                lineOffset=0, pixelOffset=0):
+    '''Create list of GCPs from grids of latitude and longitude
+
+    Values of <lat> and <lon> are taken at given rows/columns and converted
+    into GCPs at once. Points with invalid lat/lon (NaN or outside
+    [-90, 90], [-180, 180]) are skipped.
+
+    Parameters
+    ----------
+    lat, lon : 2D numpy arrays
+        grids with latitudes and longitudes
+    rowIndices, colIndices : numpy arrays (of the same shape)
+        rows and columns in lat/lon grids of the GCPs
+    lineStep, pixelStep : int or float
+        step of the lat/lon grids relative to the image
+    lineOffset, pixelOffset : int or float
+        offset of the lat/lon grids relative to the image
+
+    Returns
+    -------
+    gcps : list with GDAL GCPs
+        GCPX, GCPY = lon, lat; GCPPixel = pixelOffset + col * pixelStep;
+        GCPLine = lineOffset + row * lineStep
+
+    '''
+    rowIndices = np.array(rowIndices, 'int64').flatten()
+    colIndices = np.array(colIndices, 'int64').flatten()
+    gcpLat = np.array(lat[rowIndices, colIndices], 'float64')
+    gcpLon = np.array(lon[rowIndices, colIndices], 'float64')
+
+    # remove invalid lat/lon
+    valid = (np.isfinite(gcpLat) * np.isfinite(gcpLon) *
+             (gcpLat >= -90) * (gcpLat <= 90) *
+             (gcpLon >= -180) * (gcpLon <= 180))
+    pixels = pixelOffset + colIndices[valid] * pixelStep
+    lines = lineOffset + rowIndices[valid] * lineStep
+
+    return [gdal.GCP(x, y, 0, pixel, line) for x, y, pixel, line in
+            zip(gcpLon[valid].tolist(), gcpLat[valid].tolist(),
+                pixels.tolist(), lines.tolist())]
+
+def refine_gcp_indices(lat, lon, rows, cols, tolerance, maxLevels=4):
+    '''Add GCPs where lat/lon grids are far from bilinear
+
+    Cells of the regular grid given by <rows> and <cols> are tested:
+    lat/lon in the center of the cell are compared with the mean of the
+    four corners. If the difference exceeds <tolerance>, the cell is split
+    in four and the new corners are added. Splitting is repeated up to
+    <maxLevels> times. Cells where lat/lon are nearly affine are kept
+    with the original (sparse) GCPs.
+
+    Parameters
+    ----------
+    lat, lon : 2D numpy arrays
+        grids with latitudes and longitudes
+    rows, cols : 1D numpy arrays
+        increasing rows and columns of the initial regular grid of GCPs
+    tolerance : float
+        maximum difference (degrees) between the center and mean of the
+        corners of a cell
+    maxLevels : int
+        maximum number of cell splits
+
+    Returns
+    -------
+    rowIndices, colIndices : 1D numpy arrays
+        rows and columns of all GCPs (initial and added)
+
+    '''
+    rows = np.array(rows, 'int64')
+    cols = np.array(cols, 'int64')
+    colIndices, rowIndices = np.meshgrid(cols, rows)
+    rowIndices = [rowIndices.flatten()]
+    colIndices = [colIndices.flatten()]
+
+    # corners of all cells of the initial grid
+    c0, r0 = np.meshgrid(cols[:-1], rows[:-1])
+    c1, r1 = np.meshgrid(cols[1:], rows[1:])
+    r0, r1, c0, c1 = r0.flatten(), r1.flatten(), c0.flatten(), c1.flatten()
+
+    for level in range(maxLevels):
+        rc = (r0 + r1) / 2
+        cc = (c0 + c1) / 2
+        error = np.zeros(len(r0))
+        for grid in [lat, lon]:
+            cornersMean = (grid[r0, c0].astype('float64') + grid[r0, c1] +
+                           grid[r1, c0] + grid[r1, c1]) / 4.
+            gridError = np.abs(grid[rc, cc] - cornersMean)
+            if grid is lon:
+                # difference of longitudes across 180
+                gridError = np.abs((gridError + 180) % 360 - 180)
+            error = np.maximum(error, gridError)
+
+        # split only cells which are not linear and can be split
+        split = ((error > tolerance) *
+                 (((r1 - r0) > 1) + ((c1 - c0) > 1)))
+        if not split.any():
+            break
+        r0, r1, c0, c1 = r0[split], r1[split], c0[split], c1[split]
+        rc, cc = rc[split], cc[split]
+
+        # add center and middles of sides
+        rowIndices += [rc, r0, r1, rc, rc]
+        colIndices += [cc, cc, cc, c0, c1]
+
+        # four new cells
+        r0, r1, c0, c1 = (np.hstack([r0, r0, rc, rc]),
+                          np.hstack([rc, rc, r1, r1]),
+                          np.hstack([c0, cc, c0, cc]),
+                          np.hstack([cc, c1, cc, c1]))
+
+    # remove duplicates
+    rowIndices = np.hstack(rowIndices)
+    colIndices = np.hstack(colIndices)
+    pointIndices = np.unique(rowIndices * lat.shape[1] + colIndices)
+
+    return pointIndices / lat.shape[1], pointIndices % lat.shape[1]
+
 def initial_bearing(lon1, lat1, lon2, lat2):
         '''Initial bearing when traversing from point1 (lon1, lat1)
         to point2 (lon2, lat2)
@@ -576,5 +833,239 @@ def set_defaults(dictionary, newParm):
 
         return dictionary
 
+def read_file_header(fileName, headerSize=512):
+    '''Read first bytes of a file for testing against mapper signatures
+
+    Parameters
+    ----------
+    fileName : string
+        name of the input file
+    headerSize : int
+        number of bytes to read
+
+    Returns
+    --------
+    header : string
+        first <headerSize> bytes of the file or '' if the file cannot be read
+
+    '''
+    header = ''
+    if os.path.isfile(fileName):
+        try:
+            f = open(fileName, 'rb')
+            header = f.read(headerSize)
+            f.close()
+        except IOError:
+            pass
+
+    return header
+
+def match_signature(signature, fileName, driverName='', metadata=None,
+                    header=''):
+    '''Check if input file matches the signature declared by a mapper
+
+    Signature is a dictionary (or a list of dictionaries, any of which
+    should match) with cheap probes of the input file:
+        'driver' : list of short names of GDAL drivers
+        'metadata' : dictionary with names of metadata and regular
+            expressions which should match values of the metadata
+        'fileName' : regular expression which should match the file name
+        'magic' : tuple with (offset, string) of bytes in the file header
+    All probes given in a dictionary should match.
+
+    Parameters
+    ----------
+    signature : dict, list of dicts or None
+        signature of a mapper (Mapper.signature)
+    fileName : string
+        name of the input file
+    driverName : string
+        short name of the GDAL driver which opened the file
+    metadata : dictionary
+        metadata of the GDAL dataset
+    header : string
+        first bytes of the file (see read_file_header())
+
+    Returns
+    --------
+    True if file matches any of the signatures or if signature is None
+
+    '''
+    if signature is None:
+        return True
+
+    if isinstance(signature, dict):
+        signature = [signature]
+
+    if metadata is None:
+        metadata = {}
+
+    for sig in signature:
+        if 'driver' in sig and driverName not in sig['driver']:
+            continue
+        if ('fileName' in sig and
+                re.search(sig['fileName'], fileName) is None):
+            continue
+        if 'magic' in sig:
+            offset, magic = sig['magic']
+            if header[offset:offset + len(magic)] != magic:
+                continue
+        metadataMatch = True
+        for key in sig.get('metadata', {}):
+            if (key not in metadata or
+                    re.search(sig['metadata'][key], metadata[key]) is None):
+                metadataMatch = False
+                break
+        if metadataMatch:
+            return True
+
+    return False
+
+# Cache of mappers available in sys.path. Shared by all Nansat objects:
+#   'sysPath' : tuple with sys.path used for search of mappers
+#   'mapperList' : list of names of mapper files (e.g. 'mapper_asar.py')
+#   'modules' : mapper name => imported module
+#   'indexes' : tuple(mapperList) => index of mappers by signatures
+mapperCache = {'sysPath': None, 'mapperList': [], 'modules': {},
+               'indexes': {}}
+
+def clear_mapper_cache():
+    '''Clear cache of mappers
+
+    Should be called if mappers were added to or removed from the folders in
+    sys.path while the program is running. The next call to get_mapper_list()
+    will search for mappers again.
+
+    Modifies
+    ---------
+    mapperCache
+
+    '''
+    mapperCache['sysPath'] = None
+    mapperCache['mapperList'] = []
+    mapperCache['modules'] = {}
+    mapperCache['indexes'] = {}
+
+def get_mapper_list():
+    '''Get list of mappers available in sys.path
+
+    Search for mapper_*.py in all folders in sys.path only once and return
+    the cached list at the next calls. Search is repeated if sys.path was
+    changed or if clear_mapper_cache() was called.
+
+    Returns
+    --------
+    mapperList : list of strings
+        names of mapper files, mapper_generic.py is the last one
+
+    '''
+    sysPath = tuple(sys.path)
+    if mapperCache['sysPath'] != sysPath:
+        clear_mapper_cache()
+        mapperList = []
+        for folder in sysPath:
+            for mapper in glob.glob(folder + '/mapper_*.py'):
+                mapperList.append(os.path.basename(mapper))
+
+        # pop and append generic mapper to the end
+        if 'mapper_generic.py' in mapperList:
+            mapperList.pop(mapperList.index('mapper_generic.py'))
+            mapperList.append('mapper_generic.py')
+
+        mapperCache['sysPath'] = sysPath
+        mapperCache['mapperList'] = mapperList
+
+    # return a copy, so that cache is not changed by the caller
+    return list(mapperCache['mapperList'])
+
+def import_mapper(mapperName):
+    '''Import mapper module once and return it from the cache later
+
+    Parameters
+    -----------
+    mapperName : string
+        name of the mapper module (e.g. 'mapper_asar')
+
+    Returns
+    --------
+    mapper_module : module
+        imported mapper
+
+    Raises
+    -------
+    ImportError : if the mapper cannot be imported
+
+    '''
+    if mapperName not in mapperCache['modules']:
+        mapperCache['modules'][mapperName] = __import__(mapperName)
+
+    return mapperCache['modules'][mapperName]
+
+def get_mapper_index(mapperList):
+    ''' Get index of mappers by their signatures
+
+    Import each mapper from the list once, read signature of the Mapper
+    (Mapper.signature), group mappers by GDAL drivers given in signatures.
+    The index is cached for the given list of mappers in mapperCache.
+
+    Parameters
+    -----------
+    mapperList : list of strings
+        names of mapper files (e.g. 'mapper_asar.py')
+
+    Returns
+    --------
+    mapperIndex : dictionary
+        'signatures' : mapper name => signature (or None)
+        'drivers' : GDAL driver name => list of mapper names
+        'any' : list of mapper names, applicable to any driver
+
+    '''
+    key = tuple(mapperList)
+    if key in mapperCache['indexes']:
+        return mapperCache['indexes'][key]
+
+    mapperIndex = {'signatures': {}, 'drivers': {}, 'any': []}
+    for iMapper in mapperList:
+        iMapper = iMapper.replace('.py', '')
+        try:
+            mapper_module = import_mapper(iMapper)
+        except:
+            # mappers which cannot be imported are not used
+            continue
+        signature = getattr(mapper_module.Mapper, 'signature', None)
+        mapperIndex['signatures'][iMapper] = signature
+
+        # sort mappers by GDAL driver
+        if isinstance(signature, dict):
+            signature = [signature]
+        if signature is None or any(['driver' not in sig
+                                     for sig in signature]):
+            mapperIndex['any'].append(iMapper)
+        else:
+            for sig in signature:
+                for driverName in sig['driver']:
+                    mapperIndex['drivers'].setdefault(driverName, [])
+                    mapperIndex['drivers'][driverName].append(iMapper)
+
+    mapperCache['indexes'][key] = mapperIndex
+    return mapperIndex
+
+def prewarm_mappers():
+    '''Find and import all mappers and build index of their signatures
+
+    Useful before processing of many files: the first Nansat object will
+    not have to spend time on the search and import of mappers.
+
+    Returns
+    --------
+    mapperList : list of strings
+        names of the available mapper files
+
+    '''
+    mapperList = get_mapper_list()
+    get_mapper_index(mapperList)
+
+    return mapperList
 
 
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# Name:    test_nansat.py
+# Purpose: Tests of Nansat
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+import os
+import sys
+import unittest
+
+# use nansat from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from domain import Domain
+    from nansat import Nansat
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class BandsIndexTest(unittest.TestCase):
+    def setUp(self):
+        domain = Domain('+proj=latlong +datum=WGS84 +ellps=WGS84 +no_defs',
+                        '-te 25 70 35 72 -ts 30 20')
+        self.array = np.arange(600, dtype='float32').reshape(20, 30)
+        self.n = Nansat(domain=domain, array=self.array,
+                        parameters={'name': 'band1'})
+
+    def test_rename_with_gdal_band(self):
+        # index of bands is built
+        np.testing.assert_array_equal(self.n['band1'], self.array)
+        self.n.get_GDALRasterBand('band1').SetMetadataItem('name', 'band2')
+        np.testing.assert_array_equal(self.n['band2'], self.array)
+        self.assertEqual(self.n.get_metadata('name', 'band2'), 'band2')
+
+    def test_rename_with_set_metadata(self):
+        np.testing.assert_array_equal(self.n['band1'], self.array)
+        self.n.set_metadata('name', 'band2', 'band1')
+        np.testing.assert_array_equal(self.n['band2'], self.array)
+
+
+if __name__ == '__main__':
+    unittest.main()
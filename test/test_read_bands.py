@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Name:    test_read_bands.py
+# Purpose: Check that Nansat.read_bands() gives the same data as n[band]
+#          for derived bands with complex sources
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+import os
+import sys
+import unittest
+
+# use nansat from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from nansat_tools import gdal
+    from domain import Domain
+    from nansat import Nansat
+    from vrt import VRT
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class ReadBandsTest(unittest.TestCase):
+    def setUp(self):
+        domain = Domain('+proj=latlong +datum=WGS84 +ellps=WGS84 +no_defs',
+                        '-te 25 70 35 72 -ts 300 200')
+        self.n = Nansat(domain=domain)
+        complexArray = (np.random.randn(200, 300) +
+                        1j * np.random.randn(200, 300)).astype('complex64')
+        # keep VRT with the complex source while the derived bands are read
+        self.complexVRT = VRT(array=complexArray)
+        for pixelFunctionType in ['intensity', 'real', 'imag', 'mod']:
+            self.n.raw._create_band([{'SourceFilename':
+                                      self.complexVRT.fileName,
+                                      'SourceBand': 1}],
+                                    {'name': pixelFunctionType,
+                                     'PixelFunctionType': pixelFunctionType,
+                                     'dataType': gdal.GDT_Float32})
+        self.n.raw.dataset.FlushCache()
+
+    def test_derived_bands_with_complex_source(self):
+        bandNames = ['intensity', 'real', 'imag', 'mod']
+        bandsData = self.n.read_bands(bandNames, blockSize=64)
+        for bandName, bandData in zip(bandNames, bandsData):
+            self.assertEqual(bandData.dtype, self.n[bandName].dtype)
+            np.testing.assert_array_equal(bandData, self.n[bandName])
+
+
+if __name__ == '__main__':
+    unittest.main()
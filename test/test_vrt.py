@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# Name:    test_vrt.py
+# Purpose: Tests of VRT
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# use nansat from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from nansat_tools import gdal, latlongSRS
+    import vrt
+    from vrt import VRT, GeolocationArray
+except ImportError:
+    np = None
+
+
+def create_gcps_vrt(array):
+    '''Create VRT from array with dense GCPs of a curved lat/lon grid'''
+    ySize, xSize = array.shape
+    gcps = []
+    for line in np.linspace(0, ySize, 20):
+        for pixel in np.linspace(0, xSize, 20):
+            lon = 10 + 0.01 * pixel + 0.00002 * pixel * line
+            lat = 60 - 0.01 * line + 0.00001 * pixel ** 2
+            gcps.append(gdal.GCP(lon, lat, 0, pixel, line))
+
+    return VRT(array=array, srcGCPs=gcps,
+               srcGCPProjection=latlongSRS.ExportToWkt())
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class CreateWarpedVRTTest(unittest.TestCase):
+    def setUp(self):
+        self.cols, self.rows = np.meshgrid(np.arange(200, dtype='float32'),
+                                           np.arange(200, dtype='float32'))
+        self.vrt = create_gcps_vrt(self.cols)
+        self.dstSRS = latlongSRS.ExportToWkt()
+        self.dstGeoTransform = (10.5, 0.01, 0, 59.5, 0, -0.01)
+
+    def test_tps_transformer_in_xml(self):
+        warpedVRT = self.vrt.create_warped_vrt(self.dstSRS, 100, 100,
+                                               self.dstGeoTransform,
+                                               tps=True)
+        warpedXML = warpedVRT.read_xml()
+        self.assertTrue('SrcTPSTransformer' in warpedXML)
+        self.assertFalse('GCPTransformer' in warpedXML)
+
+    def test_thinned_gcps_fit_all_gcps(self):
+        # values of the source are pixel coordinates (+1, 0 is no data)
+        for array in [self.cols + 1, self.rows + 1]:
+            vrt = create_gcps_vrt(array)
+            warpedFull = vrt.create_warped_vrt(self.dstSRS, 100, 100,
+                                               self.dstGeoTransform,
+                                               tps=True, eResampleAlg=1,
+                                               gcpTolerance=None)
+            warpedThin = vrt.create_warped_vrt(self.dstSRS, 100, 100,
+                                               self.dstGeoTransform,
+                                               tps=True, eResampleAlg=1,
+                                               gcpTolerance=0.5)
+            self.assertTrue(warpedThin.gcpReport['gcpCount'] <
+                            warpedThin.gcpReport['totalCount'])
+            self.assertTrue(warpedThin.gcpReport['maxError'] <= 0.5)
+            full = warpedFull.dataset.ReadAsArray()
+            thin = warpedThin.dataset.ReadAsArray()
+            valid = (full > 0) * (thin > 0)
+            self.assertTrue(valid.sum() > 0)
+            # error is below the tolerance at GCPs and close to it between
+            error = np.abs(full[valid] - thin[valid])
+            self.assertTrue(error.mean() <= 0.5)
+            self.assertTrue(error.max() <= 1.0)
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class WarpCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.options = dict(vrt.warpCacheOptions)
+        self.directory = tempfile.mkdtemp()
+        vrt.clear_warp_cache()
+
+    def tearDown(self):
+        vrt.clear_warp_cache()
+        vrt.warpCacheOptions.update(self.options)
+        shutil.rmtree(self.directory)
+
+    def test_hit_and_miss(self):
+        cols = np.meshgrid(np.arange(50, dtype='float32'),
+                           np.arange(50, dtype='float32'))[0]
+        srcVRT = create_gcps_vrt(cols)
+        dstSRS = latlongSRS.ExportToWkt()
+        warpedVRT1 = srcVRT.create_warped_vrt(dstSRS, 30, 30,
+                                              (10.05, 0.01, 0,
+                                               59.95, 0, -0.01))
+        self.assertEqual(len(vrt.warpCache), 1)
+        # same warping: hit
+        warpedVRT2 = srcVRT.create_warped_vrt(dstSRS, 30, 30,
+                                              (10.05, 0.01, 0,
+                                               59.95, 0, -0.01))
+        self.assertEqual(len(vrt.warpCache), 1)
+        np.testing.assert_array_equal(warpedVRT1.dataset.ReadAsArray(),
+                                      warpedVRT2.dataset.ReadAsArray())
+        # other destination: miss
+        srcVRT.create_warped_vrt(dstSRS, 20, 20,
+                                 (10.05, 0.01, 0, 59.95, 0, -0.01))
+        self.assertEqual(len(vrt.warpCache), 2)
+
+    def test_lru_eviction(self):
+        vrt.set_warp_cache(memorySize=250)
+        for key in ['a', 'b', 'c']:
+            vrt.put_warp_cache(key, key * 100)
+        # only two XML fit: the least recently used is removed
+        self.assertEqual(vrt.warpCache.keys(), ['b', 'c'])
+        # using 'b' makes 'c' the least recently used
+        self.assertEqual(vrt.get_warp_cache('b'), ('b' * 100, None))
+        vrt.put_warp_cache('d', 'd' * 100)
+        self.assertEqual(vrt.warpCache.keys(), ['b', 'd'])
+        self.assertEqual(vrt.get_warp_cache('a'), (None, None))
+
+    def test_disk_cache(self):
+        vrt.set_warp_cache(diskSize=1000, directory=self.directory)
+        gcpReport = {'gcpCount': 16, 'totalCount': 400,
+                     'maxError': 0.1, 'meanError': 0.01}
+        vrt.put_warp_cache('a', '<VRTDataset/>', gcpReport)
+        vrt.warpCache.clear()
+        self.assertEqual(vrt.get_warp_cache('a'),
+                         ('<VRTDataset/>', gcpReport))
+
+    def test_geolocation_key_independent_of_file_names(self):
+        lon, lat = np.meshgrid(np.linspace(10, 12, 30),
+                               np.linspace(60, 61, 20))
+        geoloc1 = GeolocationArray(VRT(array=lon), VRT(array=lat))
+        geoloc2 = GeolocationArray(VRT(array=lon.copy()),
+                                   VRT(array=lat.copy()))
+        geoloc3 = GeolocationArray(VRT(array=lon + 1), VRT(array=lat))
+        self.assertNotEqual(geoloc1.d['X_DATASET'], geoloc2.d['X_DATASET'])
+        self.assertEqual(geoloc1.get_key(), geoloc2.get_key())
+        self.assertNotEqual(geoloc1.get_key(), geoloc3.get_key())
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class CloseTest(unittest.TestCase):
+    def setUp(self):
+        self.array = np.arange(2500, dtype='float32').reshape(50, 50) + 1
+        self.vrt = create_gcps_vrt(self.array)
+
+    def test_close_copy_keeps_source(self):
+        vrtCopy = self.vrt.copy()
+        self.assertTrue(vrtCopy.srcVRT is self.vrt)
+        vrtCopy.close()
+        self.assertFalse(getattr(self.vrt, 'closed', False))
+        np.testing.assert_array_equal(self.vrt.dataset.ReadAsArray(),
+                                      self.array)
+
+    def test_close_warped_keeps_source(self):
+        warpedVRT = self.vrt.create_warped_vrt(latlongSRS.ExportToWkt(),
+                                               30, 30,
+                                               (10.05, 0.01, 0,
+                                                59.95, 0, -0.01))
+        warpedVRT.close()
+        self.assertTrue(warpedVRT.dataset is None)
+        np.testing.assert_array_equal(self.vrt.dataset.ReadAsArray(),
+                                      self.array)
+
+
+if __name__ == '__main__':
+    unittest.main()
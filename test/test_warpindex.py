@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# Name:    test_warpindex.py
+# Purpose: Tests of WarpIndex
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# use nansat from the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    from domain import Domain
+    from nansat import Nansat
+    from warpindex import WarpIndex
+except ImportError:
+    np = None
+
+latlong = '+proj=latlong +datum=WGS84 +ellps=WGS84 +no_defs'
+
+
+@unittest.skipIf(np is None, 'numpy and GDAL are required')
+class WarpIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        srcDomain = Domain(latlong, '-te 25 70 35 72 -ts 200 100')
+        self.array = np.arange(20000, dtype='float32').reshape(100, 200)
+        self.n = Nansat(domain=srcDomain, array=self.array)
+        self.dstDomain = Domain(latlong, '-te 27 70.5 33 71.5 -ts 60 50')
+        self.warpIndex = WarpIndex(self.n.raw, self.dstDomain)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_load(self):
+        fileName = os.path.join(self.directory, 'index.npz')
+        self.warpIndex.save(fileName)
+        loaded = WarpIndex(fileName=fileName)
+        np.testing.assert_array_equal(loaded.pixel, self.warpIndex.pixel)
+        np.testing.assert_array_equal(loaded.line, self.warpIndex.line)
+        self.assertEqual(loaded.srcShape, self.warpIndex.srcShape)
+        self.assertEqual(loaded.dstShape, self.warpIndex.dstShape)
+        self.assertEqual(loaded.srcKey, self.warpIndex.srcKey)
+        self.assertTrue(loaded.fits(self.n.raw, self.dstDomain))
+        np.testing.assert_array_equal(loaded.warp(self.array),
+                                      self.warpIndex.warp(self.array))
+
+    def test_fits(self):
+        self.assertTrue(self.warpIndex.fits(self.n.raw, self.dstDomain))
+        # other destination shape
+        otherDomain = Domain(latlong, '-te 27 70.5 33 71.5 -ts 30 50')
+        self.assertFalse(self.warpIndex.fits(self.n.raw, otherDomain))
+        # same shape of source but other geo-reference
+        shifted = Nansat(domain=Domain(latlong, '-te 26 70 36 72 -ts 200 100'),
+                         array=self.array)
+        self.assertFalse(self.warpIndex.fits(shifted.raw, self.dstDomain))
+        self.assertTrue(self.warpIndex.fits(shifted.raw, self.dstDomain,
+                                            sameGeoreference=False))
+
+    def test_bands_are_warped_on_demand(self):
+        self.n.reproject(self.dstDomain, warpIndex=self.warpIndex)
+        self.assertEqual(self.n.vrt.lazyBands.keys(), [1])
+        np.testing.assert_array_equal(self.n[1],
+                                      self.warpIndex.warp(self.array))
+        self.assertEqual(len(self.n.vrt.lazyBands), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -90,6 +90,272 @@ class GeolocationArray():
         self.d['PIXEL_OFFSET'] = str(pixelOffset)
         self.d['PIXEL_STEP'] = str(pixelStep)
 
+    def get_key(self):
+        '''Get hash of the geolocation array independent of file names
+
+        Names of X/Y datasets (often random VSI names) are not used,
+        instead contents of the X/Y bands are hashed together with other
+        metadata (band, offset, step, SRS). The key is computed once and
+        kept in self.key
+
+        Returns
+        --------
+        key : str
+            MD5 hash of the geolocation array ('' for empty array)
+
+        '''
+        if len(self.d) == 0:
+            return ''
+        if getattr(self, 'key', None) is None:
+            md5 = hashlib.md5()
+            md5.update(repr(sorted([(k, v) for k, v in self.d.items()
+                                    if k not in ['X_DATASET',
+                                                 'Y_DATASET']])))
+            for dsName, bandName in [('X_DATASET', 'X_BAND'),
+                                     ('Y_DATASET', 'Y_BAND')]:
+                try:
+                    dataset = gdal.Open(self.d[dsName])
+                    band = dataset.GetRasterBand(int(self.d.get(bandName,
+                                                                1)))
+                    md5.update(band.ReadAsArray().tostring())
+                except:
+                    # content cannot be read: use name of the dataset
+                    md5.update(self.d.get(dsName, ''))
+            self.key = md5.hexdigest()
+
+        return self.key
+
+# well known variables from wkv.xml: standard_name => {tag: value}
+# wkv.xml is parsed only once per process (see get_wkv_index())
+wkvIndex = None
+
+def get_wkv_index():
+    '''Parse wkv.xml once and return dictionary of well known variables
+
+    Returns
+    --------
+    wkvIndex : dictionary
+        standard_name => dictionary with all tags of the WKV
+
+    '''
+    global wkvIndex
+    if wkvIndex is None:
+        fileNameWKV = os.path.join(os.path.dirname(
+                                   os.path.realpath(__file__)), 'wkv.xml')
+        newIndex = {}
+        for iNode in Node.create(fileNameWKV).nodeList('wkv'):
+            wkvName = iNode.node('standard_name').value
+            newIndex[wkvName] = {'standard_name': wkvName}
+            for iTag in iNode.tagList():
+                newIndex[wkvName][iTag] = str(iNode.node(iTag).value)
+        wkvIndex = newIndex
+
+    return wkvIndex
+
+# cache of XML of warped VRTs (see VRT.create_warped_vrt()):
+# key => (XML, report of GCPs selection), ordered from the least to the most
+# recently used
+warpCache = OrderedDict()
+# limits of the cache:
+#   'memorySize' : total size of XML kept in memory (bytes)
+#   'diskSize' : total size of XML files on disk (bytes), 0 - no disk cache
+#   'directory' : directory for XML files on disk
+warpCacheOptions = {'memorySize': 50 * 1024 * 1024,
+                    'diskSize': 0,
+                    'directory': None}
+# placeholder for name of source dataset in the cached XML
+warpCacheSource = 'NANSAT_WARP_SOURCE_DATASET'
+# first line of XML files on disk with report of GCPs selection
+warpCacheReport = '<!-- gcpReport (.*) -->\n'
+
+def set_warp_cache(memorySize=None, diskSize=None, directory=None):
+    '''Set limits of the cache of warped VRTs
+
+    Parameters
+    -----------
+    memorySize : int
+        maximum size of XML kept in memory, bytes. 0 - no cache in memory
+    diskSize : int
+        maximum size of XML files on disk, bytes. 0 - no cache on disk
+    directory : str
+        directory for XML files (created if not exists)
+
+    Modifies
+    ---------
+    warpCacheOptions, warpCache (least recently used XML are removed)
+
+    '''
+    for key, value in [('memorySize', memorySize),
+                       ('diskSize', diskSize),
+                       ('directory', directory)]:
+        if value is not None:
+            warpCacheOptions[key] = value
+    if (warpCacheOptions['directory'] is not None and
+            not os.path.exists(warpCacheOptions['directory'])):
+        os.makedirs(warpCacheOptions['directory'])
+    _trim_warp_cache()
+
+def clear_warp_cache():
+    '''Remove all XML from the cache of warped VRTs (memory and disk)'''
+    warpCache.clear()
+    for fileName in _get_warp_cache_files():
+        os.remove(fileName)
+
+def get_warp_cache(key):
+    '''Get XML of warped VRT from the cache
+
+    Parameters
+    -----------
+    key : str
+        key of the warped VRT (see VRT._get_warp_key())
+
+    Returns
+    --------
+    warpedXML : str or None
+        XML with placeholder instead of source dataset name or None if
+        the key is not in the cache
+    gcpReport : dict or None
+        report of GCPs selection (see VRT.thin_gcps())
+
+    '''
+    if key in warpCache:
+        # move to the end (most recently used)
+        warpedXML, gcpReport = warpCache.pop(key)
+        warpCache[key] = warpedXML, gcpReport
+        return warpedXML, gcpReport
+
+    if warpCacheOptions['diskSize'] > 0:
+        fileName = os.path.join(str(warpCacheOptions['directory']),
+                                'warp_%s.xml' % key)
+        if os.path.exists(fileName):
+            warpedXML = open(fileName).read()
+            gcpReport = None
+            # report is kept in the first line
+            reportLine = re.match(warpCacheReport, warpedXML)
+            if reportLine is not None:
+                gcpReport = json.loads(reportLine.group(1))
+                warpedXML = warpedXML[reportLine.end():]
+            # update time of the file (most recently used)
+            os.utime(fileName, None)
+            put_warp_cache(key, warpedXML, gcpReport, toDisk=False)
+            return warpedXML, gcpReport
+
+    return None, None
+
+def put_warp_cache(key, warpedXML, gcpReport=None, toDisk=True):
+    '''Add XML of warped VRT to the cache
+
+    Parameters
+    -----------
+    key : str
+        key of the warped VRT (see VRT._get_warp_key())
+    warpedXML : str
+        XML with placeholder instead of source dataset name
+    gcpReport : dict or None
+        report of GCPs selection (see VRT.thin_gcps())
+    toDisk : bool
+        write XML also to disk (if disk cache is on)
+
+    Modifies
+    ---------
+    warpCache, XML files in warpCacheOptions['directory']
+
+    '''
+    if warpCacheOptions['memorySize'] > 0:
+        warpCache[key] = warpedXML, gcpReport
+    if toDisk and warpCacheOptions['diskSize'] > 0:
+        fileName = os.path.join(str(warpCacheOptions['directory']),
+                                'warp_%s.xml' % key)
+        try:
+            xmlFile = open(fileName, 'w')
+            if gcpReport is not None:
+                xmlFile.write(warpCacheReport.replace('(.*)',
+                                                      json.dumps(gcpReport)))
+            xmlFile.write(warpedXML)
+            xmlFile.close()
+        except IOError:
+            warnings.warn('Cannot write warped VRT to %s' % fileName)
+    _trim_warp_cache()
+
+def _get_warp_cache_files():
+    '''Get list of XML files in the disk cache of warped VRTs'''
+    if warpCacheOptions['directory'] is None:
+        return []
+    return glob.glob(os.path.join(warpCacheOptions['directory'],
+                                  'warp_*.xml'))
+
+def _trim_warp_cache():
+    '''Remove least recently used XML from memory and disk above limits'''
+    memorySize = sum([len(warpedXML)
+                      for warpedXML, gcpReport in warpCache.values()])
+    while len(warpCache) > 0 and memorySize > warpCacheOptions['memorySize']:
+        key, (warpedXML, gcpReport) = warpCache.popitem(last=False)
+        memorySize -= len(warpedXML)
+
+    # sort files by time of last use
+    cacheFiles = sorted(_get_warp_cache_files(), key=os.path.getmtime)
+    diskSize = sum([os.path.getsize(fileName) for fileName in cacheFiles])
+    while len(cacheFiles) > 0 and diskSize > warpCacheOptions['diskSize']:
+        fileName = cacheFiles.pop(0)
+        diskSize -= os.path.getsize(fileName)
+        os.remove(fileName)
+
+# spilling of large arrays to disk (see VRT.create_dataset_from_array()):
+#   'threshold' : arrays larger than threshold (bytes) are written into raw
+#                 files in the scratch directory. None - no spilling
+#   'directory' : scratch directory. None - temporary directory is created
+spillOptions = {'threshold': None,
+                'directory': None}
+# temporary scratch directories created by Nansat (removed at exit)
+spillDirectories = []
+
+def set_spill(threshold, directory=None):
+    '''Set spilling of large arrays into raw files on disk
+
+    Arrays added to VRT (e.g. by Nansat.add_band(array=...), mappers or
+    Mosaic) which are larger than threshold are not kept in memory but
+    written into raw files in the scratch directory and read back with
+    numpy.memmap. Files are removed when the VRT is deleted.
+
+    Parameters
+    -----------
+    threshold : int or None
+        minimum size of array (bytes) to be spilled. None - no spilling
+    directory : str
+        scratch directory (created if not exists). If None, a temporary
+        directory is created and removed at exit or by clear_spill()
+
+    Modifies
+    ---------
+    spillOptions
+
+    '''
+    spillOptions['threshold'] = threshold
+    spillOptions['directory'] = directory
+    if directory is not None and not os.path.exists(directory):
+        os.makedirs(directory)
+
+def clear_spill():
+    '''Remove temporary scratch directories with spilled arrays'''
+    while len(spillDirectories) > 0:
+        directory = spillDirectories.pop()
+        if spillOptions['directory'] == directory:
+            spillOptions['directory'] = None
+        shutil.rmtree(directory, ignore_errors=True)
+
+atexit.register(clear_spill)
+
+def _get_spill_directory():
+    '''Get scratch directory for spilled arrays (create if needed)'''
+    if spillOptions['directory'] is None:
+        directory = tempfile.mkdtemp(prefix='nansat_')
+        spillDirectories.append(directory)
+        spillOptions['directory'] = directory
+    elif not os.path.exists(spillOptions['directory']):
+        os.makedirs(spillOptions['directory'])
+
+    return spillOptions['directory']
+
 class VRT():
     '''Wrapper around GDAL VRT-file
 
@@ -147,6 +413,16 @@ class VRT():
               </VRTRasterBand>
             </VRTDataset> ''')
 
+    ArraySource = Template('''
+            <VRTDataset rasterXSize="$XSize" rasterYSize="$YSize">
+              <VRTRasterBand dataType="$DataType" band="1">
+                <SimpleSource>
+                  <SourceFilename relativeToVRT="0">$SrcFileName</SourceFilename>
+                  <SourceBand>1</SourceBand>
+                </SimpleSource>
+              </VRTRasterBand>
+            </VRTDataset> ''')
+
     ReprojectTransformer = Template('''
         <ReprojectTransformer>
           <ReprojectionTransformer>
@@ -230,6 +506,8 @@ class VRT():
         self.logger = add_logger('Nansat')
         self.fileName = self._make_filename()
         self.vrtDriver = gdal.GetDriverByName('VRT')
+        # index of band metadata and names (see get_bands_index())
+        self.bandsIndex = None
 
         # set default values of ALL params of VRT
         self.d = {
@@ -242,13 +520,11 @@ class VRT():
         'blockSize' : None,
         'zoomSize' : 500,
         'step' : 1,
+        'interpolation' : 'zoom',
+        'gcpTolerance' : 0.5,
         'geolocation' : True}
         self.d = set_defaults(self.d, kwargs)
 
-        # open and parse wkv.xml
-        fileNameWKV = os.path.join(os.path.dirname(
-                                   os.path.realpath(__file__)), 'wkv.xml')
-        self.wkvNode0 = Node.create(fileNameWKV)
         # default empty geolocation array of source
         srcGeolocationArray = GeolocationArray()
         if vrtDataset is not None:
@@ -322,11 +598,123 @@ class VRT():
 
     def __del__(self):
         ''' Destructor deletes VRT and RAW files'''
+        self._delete_files()
+
+    def _delete_files(self):
+        ''' Delete VRT and RAW files (VSI and spilled) of the VRT'''
         try:
             gdal.Unlink(self.fileName)
             gdal.Unlink(self.fileName.replace('vrt', 'raw'))
         except:
             pass
+        # delete RAW file with spilled array
+        spillFile = getattr(self, 'spillFile', None)
+        if spillFile is not None:
+            self.array = None
+            self.spillFile = None
+            try:
+                os.remove(spillFile)
+            except:
+                pass
+
+    def _get_helper_vrts(self, sources=False):
+        '''Get VRTs kept in attributes of self (e.g. bandVRTs, adsVRTs)
+
+        VRTs of the geolocation array are not included, because the
+        GeolocationArray object is often shared by several VRTs
+
+        Parameters
+        -----------
+        sources : bool
+            include the source VRT (srcVRT, set by copy() and
+            create_warped_vrt())? The source VRT is only referenced by
+            self and is usually owned by another object.
+
+        Returns
+        --------
+        helperVRTs : list of VRT objects
+
+        '''
+        helperVRTs = []
+        for attrName, attrValue in self.__dict__.items():
+            if attrName == 'geolocationArray':
+                continue
+            if attrName == 'srcVRT' and not sources:
+                continue
+            if isinstance(attrValue, dict):
+                attrValue = attrValue.values()
+            if not isinstance(attrValue, (list, tuple)):
+                attrValue = [attrValue]
+            helperVRTs += [vrt for vrt in attrValue if isinstance(vrt, VRT)]
+
+        return helperVRTs
+
+    def close(self):
+        '''Delete VSI files of the VRT and of all helper VRTs kept by it
+
+        Files are deleted immediately, without waiting for the garbage
+        collector. Helper VRTs are VRTs kept in attributes of the VRT
+        (e.g. bandVRTs, adsVRTs, real/imag). The source VRT (srcVRT) is not
+        closed: e.g. after v = n.vrt.copy(); v.close() n can still be
+        used. The VRT cannot be used after close().
+
+        Modifies
+        ---------
+        self.dataset is set to None, VRT, RAW files are deleted
+
+        '''
+        if getattr(self, 'closed', False):
+            return
+        self.closed = True
+        for vrt in self._get_helper_vrts():
+            vrt.close()
+        self.dataset = None
+        self._delete_files()
+
+    def get_memory_size(self, counted=None):
+        '''Get size of VSI files and arrays kept by the VRT and helper VRTs
+
+        Parameters
+        -----------
+        counted : set
+            ids of VRTs which are already counted (updated)
+
+        Returns
+        --------
+        memorySize : int
+            size in bytes of the VRT and RAW files in /vsimem and of arrays
+            kept in memory (spilled arrays are not counted)
+
+        '''
+        if counted is None:
+            counted = set()
+        if id(self) in counted or getattr(self, 'closed', False):
+            return 0
+        counted.add(id(self))
+
+        memorySize = 0
+        for fileName in [self.fileName, self.fileName.replace('vrt', 'raw')]:
+            try:
+                fileStat = gdal.VSIStatL(fileName)
+            except:
+                fileStat = None
+            if fileStat is not None:
+                memorySize += fileStat.size
+        array = getattr(self, 'array', None)
+        if array is not None and not isinstance(array, np.memmap):
+            memorySize += array.nbytes
+
+        helperVRTs = self._get_helper_vrts(sources=True)
+        # VRTs of geolocation array are counted (but not closed)
+        geolocationArray = getattr(self, 'geolocationArray', None)
+        for attrName in ['xVRT', 'yVRT']:
+            vrt = getattr(geolocationArray, attrName, None)
+            if isinstance(vrt, VRT):
+                helperVRTs.append(vrt)
+        for vrt in helperVRTs:
+            memorySize += vrt.get_memory_size(counted)
+
+        return memorySize
 
     def _make_filename(self, extention='vrt'):
         '''Create random VSI file name
@@ -552,6 +940,7 @@ class VRT():
         self.logger.debug('dst[name]:%s' % dst['name'])
 
         # Add Band
+        self._reset_bands_index()
         self.dataset.AddBand(int(dst['dataType']), options=options)
         dstRasterBand = self.dataset.GetRasterBand(self.dataset.RasterCount)
 
@@ -605,12 +994,91 @@ class VRT():
                               % (str(numBands), str(len(time))))
 
         # Store time as metadata key 'time' in each band
+        self._reset_bands_index()
         for i in range(numBands):
             self.dataset.GetRasterBand(i + 1).SetMetadataItem('time',
                                        str(time[i].isoformat()))
 
         return
 
+    def get_bands_index(self):
+        ''' Get (and keep) index of metadata and names of all bands
+
+        Metadata of all bands is read from the dataset only once and kept
+        in self.bandsIndex until bands are added, deleted or modified
+        (see _reset_bands_index())
+
+        Returns
+        --------
+        bandsMeta : dict
+            key = band number, value = dict with all band metadata
+        bandNames : dict
+            key = band name, value = band number
+
+        '''
+        if self.bandsIndex is None:
+            bandsMeta = {}
+            bandNames = {}
+            for iBand in range(self.dataset.RasterCount):
+                bandMeta = self.dataset.GetRasterBand(iBand + 1).GetMetadata()
+                bandsMeta[iBand + 1] = bandMeta
+                if 'name' in bandMeta:
+                    bandNames[bandMeta['name']] = iBand + 1
+            self.bandsIndex = bandsMeta, bandNames
+
+        return self.bandsIndex
+
+    def load_lazy_bands(self, bandNumbers=None):
+        ''' Add data to bands which are computed on demand
+
+        Bands listed in self.lazyBands (e.g. bands resampled with
+        WarpIndex.warp_vrt()) are created without sources. Here the data of
+        such band is computed, kept as VRT in self.bandVRTs and added as
+        source of the band.
+
+        Parameters
+        -----------
+        bandNumbers : list of int or None
+            numbers of bands to load. All lazy bands are loaded if None
+
+        Modifies
+        ---------
+        self.lazyBands, self.bandVRTs, sources of bands in self.dataset
+
+        '''
+        lazyBands = getattr(self, 'lazyBands', {})
+        if len(lazyBands) == 0:
+            return
+        if bandNumbers is None:
+            bandNumbers = lazyBands.keys()
+        loaded = False
+        for bandNumber in bandNumbers:
+            if bandNumber not in lazyBands:
+                continue
+            bandVRT = VRT(array=lazyBands.pop(bandNumber)())
+            self.bandVRTs.append(bandVRT)
+            srcXML = self.ComplexSource.substitute(
+                                Dataset=bandVRT.fileName,
+                                SourceBand=1,
+                                SourceType='ComplexSource',
+                                NODATA='',
+                                ScaleOffset=0.0,
+                                ScaleRatio=1.0,
+                                LUT='',
+                                srcXSize=bandVRT.dataset.RasterXSize,
+                                srcYSize=bandVRT.dataset.RasterYSize,
+                                dstXSize=bandVRT.dataset.RasterXSize,
+                                dstYSize=bandVRT.dataset.RasterYSize)
+            self.dataset.GetRasterBand(bandNumber).SetMetadataItem(
+                                        'source_0', srcXML, 'new_vrt_sources')
+            loaded = True
+        if loaded:
+            self.dataset.FlushCache()
+
+    def _reset_bands_index(self):
+        ''' Forget index of band metadata (bands were changed) '''
+        self.bandsIndex = None
+
     def _get_wkv(self, wkvName):
         ''' Get wkv from wkv.xml
 
@@ -625,13 +1093,8 @@ class VRT():
             WKV corresponds to the given wkv_name
 
         '''
-        wkvDict = {}
-        for iNode in self.wkvNode0.nodeList('wkv'):
-            tagsList = iNode.tagList()
-            if iNode.node('standard_name').value == wkvName:
-                wkvDict = {'standard_name': wkvName}
-                for iTag in tagsList:
-                    wkvDict[iTag] = str(iNode.node(iTag).value)
+        # copy, so that the cached WKV is not modified
+        wkvDict = dict(get_wkv_index().get(wkvName, {}))
         return wkvDict
 
     def _put_metadata(self, rasterBand, metadataDict):
@@ -662,8 +1125,17 @@ class VRT():
     def create_dataset_from_array(self, array):
         '''Create a dataset with a band from an array
 
-        Write contents of the array into flat binary file (VSI)
-        Write VRT file with RawRastesrBand, which points to the binary file
+        Open the memory of the array with the GDAL MEM driver (no copy of
+        the data is made) and write VRT file with SimpleSource, which points
+        to the MEM dataset. The array is kept in self.array while the VRT
+        exists, changes in the array are visible in the VRT.
+        If the array is larger than spillOptions['threshold'] (see
+        set_spill()), write it into raw file in the scratch directory,
+        keep numpy.memmap of the file in self.array and write VRT file with
+        RawRasterBand, which points to the raw file.
+        If the MEM driver cannot open the array, write contents of the array
+        into flat binary file (VSI) and write VRT file with RawRasterBand,
+        which points to the binary file.
         Open the VRT file as self.dataset with GDAL
 
         Parameters
@@ -672,19 +1144,16 @@ class VRT():
 
         Modifies
         ---------
-        binary file is written (VSI)
+        self.array : numpy array (reference to the input array or memmap)
+        self.spillFile : name of the raw file with spilled array
+        binary file is written (VSI or scratch directory), if MEM driver is
+        not used
         VRT file is written (VSI)
         self.dataset is opened
 
         '''
         arrayDType = array.dtype.name
         arrayShape = array.shape
-        # create flat binary file from array (in VSI)
-        binaryFile = self.fileName.replace('.vrt', '.raw')
-        ofile = gdal.VSIFOpenL(binaryFile, 'wb')
-        gdal.VSIFWriteL(array.tostring(), len(array.tostring()), 1, ofile)
-        gdal.VSIFCloseL(ofile)
-        array = None
 
         self.logger.debug('arrayDType: %s', arrayDType)
 
@@ -712,6 +1181,42 @@ class VRT():
 
         self.logger.debug('DataType: %s', dataType)
 
+        # write large array into raw file in scratch directory
+        if (spillOptions['threshold'] is not None and
+                array.nbytes > spillOptions['threshold']):
+            memFileName = None
+            binaryFile = os.path.join(_get_spill_directory(),
+                                      os.path.basename(self.fileName))
+            binaryFile = binaryFile.replace('.vrt', '.raw')
+            np.ascontiguousarray(array).tofile(binaryFile)
+            self.spillFile = binaryFile
+            self.array = np.memmap(binaryFile, dtype=array.dtype, mode='r',
+                                   shape=arrayShape)
+            array = None
+            self.logger.debug('Array is spilled to %s' % binaryFile)
+        else:
+            # open memory of the array with MEM driver (without copying)
+            memFileName = self._get_mem_filename(array, dataType)
+
+        if memFileName is not None:
+            self.array = array
+            contents = self.ArraySource.substitute(XSize=arrayShape[1],
+                                                   YSize=arrayShape[0],
+                                                   DataType=dataType,
+                                                   SrcFileName=memFileName)
+            self.write_xml(contents)
+            return
+
+        # create flat binary file from array (in VSI)
+        if array is not None:
+            binaryFile = self.fileName.replace('.vrt', '.raw')
+            arrayString = np.ascontiguousarray(array).tostring()
+            ofile = gdal.VSIFOpenL(binaryFile, 'wb')
+            gdal.VSIFWriteL(arrayString, len(arrayString), 1, ofile)
+            gdal.VSIFCloseL(ofile)
+            arrayString = None
+            array = None
+
         lineOffset = str(int(pixelOffset) * arrayShape[1])
         contents = self.RawRasterBandSource.substitute(XSize=arrayShape[1],
                                                        YSize=arrayShape[0],
@@ -723,6 +1228,43 @@ class VRT():
         #write XML contents to
         self.write_xml(contents)
 
+    def _get_mem_filename(self, array, dataType):
+        '''Get name of GDAL MEM dataset pointing to the memory of array
+
+        Parameters
+        -----------
+        array : 2D numpy array
+            with non-negative strides (e.g. views like array.real are
+            accepted without copying)
+        dataType : str
+            name of GDAL data type
+
+        Returns
+        --------
+        memFileName : str or None
+            'MEM:::DATAPOINTER=...' string or None if the array cannot be
+            opened by the MEM driver
+
+        '''
+        if (dataType is None or array.ndim != 2 or
+                min(array.strides) < 0 or not array.dtype.isnative):
+            return None
+
+        memFileName = ('MEM:::DATAPOINTER=%d,PIXELS=%d,LINES=%d,BANDS=1,'
+                       'DATATYPE=%d,PIXELOFFSET=%d,LINEOFFSET=%d'
+                       % (array.ctypes.data, array.shape[1], array.shape[0],
+                          gdal.GetDataTypeByName(dataType),
+                          array.strides[1], array.strides[0]))
+        try:
+            memDataset = gdal.Open(memFileName)
+        except:
+            memDataset = None
+        if memDataset is None:
+            self.logger.debug('Cannot open array with MEM driver')
+            return None
+
+        return memFileName
+
     def read_xml(self):
         '''Read XML content of the VRT-file
 
@@ -767,13 +1309,53 @@ class VRT():
         gdal.VSIFCloseL(vsiFile)
         # re-open self.dataset with new content
         self.dataset = gdal.Open(self.fileName)
+        self._reset_bands_index()
+
+    def read_xml_node(self):
+        '''Read XML content of the VRT-file and parse it into Node
+
+        Several modifications of the VRT can be done in the Node and written
+        into the VRT-file at once with write_xml_node(). The VRT dataset
+        should not be modified via GDAL API in between.
+
+        Returns
+        --------
+        node0 : Node
+            root node of the XML content
+
+        '''
+        return Node.create(str(self.read_xml()))
+
+    def write_xml_node(self, node0):
+        '''Write XML content from the Node into a VRT dataset
+
+        Parameters
+        -----------
+        node0 : Node
+            root node of the XML content (see read_xml_node())
+
+        Modifies
+        ---------
+        self.dataset
+            self.dataset is re-opened
+
+        '''
+        self.write_xml(str(node0.rawxml()))
 
     def export(self, fileName):
         '''Export VRT file as XML into given <fileName>'''
         self.vrtDriver.CreateCopy(fileName, self.dataset)
 
     def copy(self):
-        '''Creates full copy of VRT dataset'''
+        '''Creates full copy of VRT dataset
+
+        The copy keeps reference to self (vrt.srcVRT): XML of the copy
+        points to the same sources (e.g. memory of self.array or RAW files),
+        which should not be deleted while the copy exists.
+
+        '''
+        # data of all bands should be in the copy
+        self.load_lazy_bands()
         try:
             # deep copy (everything including bands)
             vrt = VRT(vrtDataset=self.dataset,
@@ -782,6 +1364,9 @@ class VRT():
             # shallow copy (only geometadata)
             vrt = VRT(gdalDataset=self.dataset,
                       geolocationArray=self.geolocationArray)
+        # add source VRT (self) to the copy
+        # in order not to loose array or RAW file from self
+        vrt.srcVRT = self
         return vrt
 
     def add_geolocationArray(self, geolocationArray=None):
@@ -866,7 +1451,7 @@ class VRT():
 
     def _modify_warped_XML(self, rasterXSize=0, rasterYSize=0,
                            geoTransform=None, srcSRS=None, dstSRS=None,
-                           **kwargs):
+                           node0=None, **kwargs):
         ''' Modify rasterXsize, rasterYsize and geotranforms in the warped VRT
 
         Parameters
@@ -877,6 +1462,9 @@ class VRT():
             desired Y size of warped image
         geoTransform : tuple of 6 ints
             desired GeoTransform size of the warped image
+        node0 : Node
+            parsed XML of the VRT (see read_xml_node()). If given, only
+            node0 is modified and nothing is written into the VRT-file
 
         Parameters (**kwargs)
         ---------------------
@@ -895,9 +1483,10 @@ class VRT():
         self.d['WorkingDataType'] = None
         self.d = set_defaults(self.d, kwargs)
 
-        warpedXML = self.read_xml()
-
-        node0 = Node.create(warpedXML)
+        # read XML only if it is not given
+        writeXML = node0 is None
+        if writeXML:
+            node0 = self.read_xml_node()
 
         if rasterXSize > 0:
             node0.replaceAttribute('rasterXSize', str(rasterXSize))
@@ -937,36 +1526,46 @@ class VRT():
             print 'node0.xml()', node0.xml()
         """
 
-        self.write_xml(str(node0.rawxml()))
+        if writeXML:
+            self.write_xml_node(node0)
 
-    def _remove_geotransform(self):
+    def _remove_geotransform(self, node0=None):
         '''Remove GeoTransfomr from VRT Object
 
+        Parameters
+        -----------
+        node0 : Node
+            parsed XML of the VRT (see read_xml_node()). If given, only
+            node0 is modified and nothing is written into the VRT-file
+
         Modifies
         ---------
         The tag <GeoTransform> is revoved from the VRT-file
 
         '''
         # read XML content from VRT
-        tmpVRTXML = self.read_xml()
+        writeXML = node0 is None
+        if writeXML:
+            node0 = self.read_xml_node()
         # find and remove GeoTransform
-        node0 = Node.create(tmpVRTXML)
-        node1 = node0.delNode('GeoTransform')
+        node0.delNode('GeoTransform')
         # Write the modified elemements back into temporary VRT
-        self.write_xml(str(node0.rawxml()))
+        if writeXML:
+            self.write_xml_node(node0)
 
     def _add_gcp_metadata(self):
         '''Add GCPs to metadata (required e.g. by Nansat.export())
 
-        Creates string representation of GCPs line/pixel/X/Y
-        Adds these string to metadata
+        Creates compact representation of GCPs pixel/line/X/Y: array of
+        float64 values (N x 4) compressed with zlib and encoded with base64
+        Adds this string to metadata in chunks (NANSAT_GCPs_000, ...)
+        (see mapper_generic.add_gcps_from_metadata())
 
         Modifies
         ---------
         Add self.vrd.dataset.Metadata
 
         '''
-        gcpNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
         gcps = self.dataset.GetGCPs()
         srs = self.dataset.GetGCPProjection()
         chunkLength = 5000
@@ -978,30 +1577,17 @@ class VRT():
                                          srs.replace(',', '|').replace('"',
                                                                        '&'))
 
-            # make empty strings
-            gspStrings = ['', '', '', '']
-
-            # fill string with values
-            for gcp in gcps:
-                gspStrings[0] = '%s%05d| ' % (gspStrings[0],
-                                              int(gcp.GCPPixel))
-                gspStrings[1] = '%s%05d| ' % (gspStrings[1],
-                                              int(gcp.GCPLine))
-                gspStrings[2] = '%s%012.8f| ' % (gspStrings[2], gcp.GCPX)
-                gspStrings[3] = '%s%012.8f| ' % (gspStrings[3], gcp.GCPY)
-
-            for i, gspString in enumerate(gspStrings):
-                #split string into chunks
-                numberOfChunks = int(float(len(gspString)) / chunkLength)
-                chunki = 0
-                for chunki in range(0, numberOfChunks + 1):
-                    chunk = gspString[(chunki * chunkLength):
-                                      min(((chunki + 1) * chunkLength),
-                                      len(gspString))]
-                    # add chunk to metadata
-                    self.dataset.SetMetadataItem('NANSAT_%s_%03d'
-                                                 % (gcpNames[i], chunki),
-                                                 chunk)
+            # make array with pixel, line, X, Y of all GCPs
+            gcpArray = np.array([(gcp.GCPPixel, gcp.GCPLine,
+                                  gcp.GCPX, gcp.GCPY) for gcp in gcps], '<f8')
+            gcpString = base64.b64encode(zlib.compress(gcpArray.tostring()))
+
+            #split string into chunks and add to metadata
+            for chunki in range(0, len(gcpString), chunkLength):
+                self.dataset.SetMetadataItem('NANSAT_GCPs_%03d'
+                                             % (chunki / chunkLength),
+                                             gcpString[chunki:
+                                                       chunki + chunkLength])
 
     def create_warped_vrt(self, dstSRS=None, xSize=0, ySize=0,
                           geoTransform=None, dstGCPs=[],
@@ -1081,12 +1667,18 @@ class VRT():
             3 : CubicSpline,
             4 : Lancoz
         tps :  bool (False)
+        gcpTolerance : float (0.5)
+            if tps is True, only the smallest subset of GCPs which fits all
+            GCPs with this error (pixels) is used (see thin_gcps()).
+            None - all GCPs are used
         WorkingDataType : (None)
         blockSize : (None)
 
         Returns
         --------
         warpedVRT : VRT object with WarpedVRT
+            warpedVRT.gcpReport : dict with number of selected GCPs and
+            achieved error (see thin_gcps()) or None
 
         '''
         # modify the default values using input values
@@ -1095,12 +1687,40 @@ class VRT():
         self.d['use_geotransform'] = True
         self.d['eResampleAlg'] = 0
         self.d['tps'] = False
+        self.d['gcpTolerance'] = 0.5
         self.d['WorkingDataType'] = None
         self.d['blockSize'] = None
         self.d = set_defaults(self.d, kwargs)
 
+        # use XML of warped VRT from cache, if the same warping was done
+        rawFileName = str(os.path.basename(self.fileName))
+        warpKey = self._get_warp_key(dstSRS, xSize, ySize, geoTransform,
+                                     dstGCPs, dstGeolocationArray)
+        warpedXML, gcpReport = get_warp_cache(warpKey)
+        if warpedXML is not None:
+            self.logger.debug('Take warped VRT from cache')
+            warpedXML = warpedXML.replace(warpCacheSource,
+                                          '/vsimem/' + rawFileName)
+            warpedVRT = VRT(vrtDataset=gdal.Open(warpedXML))
+            warpedVRT.write_xml(warpedXML)
+            # metadata of bands is taken from self (not from cache)
+            for iBand in range(self.dataset.RasterCount):
+                bandMetadata = self.dataset.GetRasterBand(iBand +
+                                                          1).GetMetadata()
+                warpedVRT.dataset.GetRasterBand(iBand +
+                                                1).SetMetadata(bandMetadata)
+            if dstGeolocationArray is not None:
+                warpedVRT.add_geolocationArray(dstGeolocationArray)
+            warpedVRT.gcpReport = gcpReport
+            # add source VRT (self) to the warpedVRT
+            # in order not to loose array or RAW file from self
+            warpedVRT.srcVRT = self
+            return warpedVRT
+
         # VRT to be warped
         srcVRT = self.copy()
+        # report of GCPs selection for TPS (see thin_gcps())
+        gcpReport = None
 
         # srs to be used in AutoCreateWarpedVRT
         acwvSRS = dstSRS
@@ -1127,6 +1747,12 @@ class VRT():
             # (remove GeolocationArray and GeoTransform)
             srcVRT.dataset.SetMetadata('', 'GEOLOCATION')
             srcVRT._remove_geotransform()
+            # select subset of GCPs for fast TPS warping
+            if self.d['tps'] and self.d['gcpTolerance'] is not None:
+                gcps, gcpReport = srcVRT.thin_gcps(
+                                        tolerance=self.d['gcpTolerance'])
+                srcVRT.dataset.SetGCPs(gcps,
+                                       srcVRT.dataset.GetGCPProjection())
         elif self.d['use_geotransform']:
             # fallback to GeoTransform in input VRT
             # (remove GeolocationArray and GCP)
@@ -1157,18 +1783,43 @@ class VRT():
         self.logger.debug('create VRT object from Warped VRT GDAL Dataset')
         warpedVRT = VRT(vrtDataset=warpedVRT)
 
+        # modifications via GDAL API are done before modifications of XML
+        # if given, add dst GCPs
+        self.logger.debug('if given, add dst GCPs')
+        if len(dstGCPs) > 0:
+            warpedVRT.dataset.SetGCPs(dstGCPs, dstSRS)
+            warpedVRT.dataset.SetProjection('')
+
+        # if given, add dst GeolocationArray
+        self.logger.debug('# if given, add dst GeolocationArray')
+        if dstGeolocationArray is not None:
+            warpedVRT.add_geolocationArray(dstGeolocationArray)
+            warpedVRT.dataset.SetProjection('')
+
+        # all modifications of XML are done in one parsed tree
+        node0 = warpedVRT.read_xml_node()
+
         # set x/y size, geoTransform, blockSize
         self.logger.debug('set x/y size, geoTransform, blockSize')
         warpedVRT._modify_warped_XML(xSize, ySize,
                                      geoTransform,
                                      self.d['blockSize'],
-                                     self.d['WorkingDataType'])
+                                     self.d['WorkingDataType'],
+                                     node0=node0)
 
-        # apply thin-spline-transformation option
+        # apply thin-spline-transformation option: rename all tags with
+        # GCPTransformer (e.g. SrcGCPTransformer and GCPTransformer)
         if self.d['use_gcps'] and self.d['tps']:
-            tmpVRTXML = warpedVRT.read_xml()
-            tmpVRTXML = tmpVRTXML.replace('GCPTransformer', 'TPSTransformer')
-            warpedVRT.write_xml(tmpVRTXML)
+            nodes = [node0]
+            while len(nodes) > 0:
+                node1 = nodes.pop()
+                node1.tag = node1.tag.replace('GCPTransformer',
+                                              'TPSTransformer')
+                nodes += node1.children
+
+        # remove GeoTransform if dst GCPs or GeolocationArray are given
+        if len(dstGCPs) > 0 or dstGeolocationArray is not None:
+            warpedVRT._remove_geotransform(node0)
         """
         # TODO: implement the below option for proper handling stereo
         # projections over the pole get source projection from GCPs or
@@ -1182,31 +1833,196 @@ class VRT():
                                      blockSize, srcSRS, dstSRS)
         """
 
-        # if given, add dst GCPs
-        self.logger.debug('if given, add dst GCPs')
-        if len(dstGCPs) > 0:
-            warpedVRT.dataset.SetGCPs(dstGCPs, dstSRS)
-            warpedVRT._remove_geotransform()
-            warpedVRT.dataset.SetProjection('')
-
-        # if given, add dst GeolocationArray
-        self.logger.debug('# if given, add dst GeolocationArray')
-        if dstGeolocationArray is not None:
-            warpedVRT._remove_geotransform()
-            warpedVRT.add_geolocationArray(dstGeolocationArray)
-            warpedVRT.dataset.SetProjection('')
-
         # replace the reference from srcVRT to self
         self.logger.debug('replace the reference from srcVRT to self')
-        rawFileName = str(os.path.basename(self.fileName))
-        warpedXML = str(warpedVRT.read_xml())
-        node0 = Node.create(warpedXML)
         node1 = node0.node('GDALWarpOptions')
         node1.node('SourceDataset').value = '/vsimem/' + rawFileName
-        warpedVRT.write_xml(str(node0.rawxml()))
+        # write XML and re-open the dataset only once
+        warpedVRT.write_xml_node(node0)
+        warpedVRT.gcpReport = gcpReport
+        # add source VRT (self) to the warpedVRT
+        # in order not to loose array or RAW file from self
+        warpedVRT.srcVRT = self
+
+        # keep XML in cache (without reference to self)
+        node1.node('SourceDataset').value = warpCacheSource
+        put_warp_cache(warpKey, str(node0.rawxml()), gcpReport)
 
         return warpedVRT
 
+    def thin_gcps(self, gcps=None, tolerance=0.5, tps=True, initialCount=16,
+                  maxIterations=20):
+        ''' Select the smallest subset of GCPs which fits all GCPs
+
+        Starting from <initialCount> GCPs regularly selected from the input
+        list, the GCPs with the largest error are added until the error of
+        the TPS (or polynomial) transformation from the subset is below
+        <tolerance> for all GCPs. The error is the distance (pixels)
+        between pixel/line of the GCP and pixel/line calculated from its
+        X/Y by the transformation.
+
+        Parameters
+        -----------
+        gcps : list with GDAL GCPs
+            all GCPs (self.dataset.GetGCPs() by default)
+        tolerance : float
+            maximum error, pixels
+        tps : bool
+            use thin plate splines (True) or polynomial (False) transformation
+        initialCount : int
+            number of GCPs in the first subset
+        maxIterations : int
+            maximum number of iterations of adding GCPs
+
+        Returns
+        --------
+        gcps : list with GDAL GCPs
+            selected subset of GCPs
+        gcpReport : dict
+            'gcpCount' : number of selected GCPs
+            'totalCount' : number of all GCPs
+            'maxError', 'meanError' : achieved errors (pixels)
+
+        '''
+        if gcps is None:
+            gcps = self.dataset.GetGCPs()
+        gcpProjection = self.dataset.GetGCPProjection()
+        gcpX = np.array([gcp.GCPX for gcp in gcps])
+        gcpY = np.array([gcp.GCPY for gcp in gcps])
+        gcpPixel = np.array([gcp.GCPPixel for gcp in gcps])
+        gcpLine = np.array([gcp.GCPLine for gcp in gcps])
+
+        # first subset: GCPs regularly selected from the list
+        selected = np.zeros(len(gcps), 'bool')
+        selected[np.around(np.linspace(0, len(gcps) - 1,
+                                       min(len(gcps),
+                                           initialCount))).astype(int)] = True
+        error = np.zeros(len(gcps))
+        for iteration in range(maxIterations):
+            if selected.all():
+                error = np.zeros(len(gcps))
+                break
+            subsetGCPs = [gcps[i] for i in np.nonzero(selected)[0]]
+            error = self._get_gcps_error(subsetGCPs, gcpProjection, tps,
+                                         gcpX, gcpY, gcpPixel, gcpLine)
+            if error.max() <= tolerance:
+                break
+            # add unselected GCPs with the largest errors (at most doubling)
+            candidates = np.nonzero((~selected) * (error > tolerance))[0]
+            if len(candidates) == 0:
+                break
+            worst = np.argsort(error[candidates])[::-1][:selected.sum()]
+            selected[candidates[worst]] = True
+        else:
+            # maxIterations is reached: get error of the last subset
+            if selected.all():
+                error = np.zeros(len(gcps))
+            else:
+                subsetGCPs = [gcps[i] for i in np.nonzero(selected)[0]]
+                error = self._get_gcps_error(subsetGCPs, gcpProjection, tps,
+                                             gcpX, gcpY, gcpPixel, gcpLine)
+
+        gcpReport = {'gcpCount': int(selected.sum()),
+                     'totalCount': len(gcps),
+                     'maxError': float(error.max()) if len(gcps) else 0.,
+                     'meanError': float(error.mean()) if len(gcps) else 0.}
+        self.logger.info('Selected %(gcpCount)d of %(totalCount)d GCPs, '
+                         'max error: %(maxError)f, '
+                         'mean error: %(meanError)f pixels' % gcpReport)
+
+        return [gcps[i] for i in np.nonzero(selected)[0]], gcpReport
+
+    def _get_gcps_error(self, gcps, gcpProjection, tps,
+                        gcpX, gcpY, gcpPixel, gcpLine):
+        ''' Get error (pixels) of transformation from GCPs at given points
+
+        Parameters
+        -----------
+        gcps : list with GDAL GCPs
+            GCPs defining the transformation
+        gcpProjection : str
+            WKT of GCPs
+        tps : bool
+            use thin plate splines (True) or polynomial (False) transformation
+        gcpX, gcpY, gcpPixel, gcpLine : numpy arrays
+            X/Y and pixel/line of test points
+
+        Returns
+        --------
+        error : numpy array
+            distance between pixel/line of the test points and pixel/line
+            calculated from their X/Y (inf where cannot be calculated)
+
+        '''
+        error = np.zeros(len(gcpX)) + np.inf
+        memDataset = gdal.GetDriverByName('MEM').Create('',
+                                                 self.dataset.RasterXSize,
+                                                 self.dataset.RasterYSize, 0)
+        memDataset.SetGCPs(gcps, gcpProjection)
+        if tps:
+            options = ['METHOD=GCP_TPS']
+        else:
+            options = ['METHOD=GCP_POLYNOMIAL']
+        try:
+            transformer = gdal.Transformer(memDataset, None, options)
+            points, success = transformer.TransformPoints(1,
+                                                zip(gcpX.tolist(),
+                                                    gcpY.tolist()))
+        except:
+            return error
+        points = np.array(points)
+        success = np.array(success, 'bool')
+        error[success] = np.hypot(points[success, 0] - gcpPixel[success],
+                                  points[success, 1] - gcpLine[success])
+        error[np.isnan(error)] = np.inf
+
+        return error
+
+    def _get_warp_key(self, dstSRS, xSize, ySize, geoTransform, dstGCPs,
+                      dstGeolocationArray):
+        ''' Get key of the warped VRT for the cache of warped VRTs
+
+        The key is a hash of the geo-reference of self (size, GeoTransform,
+        projection, GCPs, content of geolocation array), data types of bands,
+        parameters of the destination and options of warping (self.d)
+
+        Parameters
+        -----------
+        dstSRS, xSize, ySize, geoTransform, dstGCPs, dstGeolocationArray
+            see create_warped_vrt()
+
+        Returns
+        --------
+        key : str
+            MD5 hash of all parameters
+
+        '''
+        def gcps2list(gcps):
+            return [(gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY, gcp.GCPZ)
+                    for gcp in gcps]
+
+        bands = []
+        for iBand in range(self.dataset.RasterCount):
+            band = self.dataset.GetRasterBand(iBand + 1)
+            bands.append((band.DataType, band.GetNoDataValue()))
+
+        dstGeolocation = None
+        if dstGeolocationArray is not None:
+            dstGeolocation = dstGeolocationArray.get_key()
+
+        keyList = [self.dataset.RasterXSize, self.dataset.RasterYSize,
+                   self.dataset.GetGeoTransform(),
+                   self.dataset.GetProjection(),
+                   gcps2list(self.dataset.GetGCPs()),
+                   self.dataset.GetGCPProjection(),
+                   self.geolocationArray.get_key(),
+                   bands,
+                   dstSRS, xSize, ySize, geoTransform,
+                   gcps2list(dstGCPs), dstGeolocation,
+                   sorted(self.d.items())]
+
+        return hashlib.md5(repr(keyList)).hexdigest()
+
     def _create_fake_gcps(self, gcps):
         '''Create GCPs with reference self.pixel/line ==> dst.pixel/line
 
@@ -1266,10 +2082,12 @@ class VRT():
 
         return {'gcps': fakeGCPs, 'srs': stereoSRSWKT}
 
-    def _latlon2gcps(self, lat, lon, numOfGCPs=100):
+    def _latlon2gcps(self, lat, lon, numOfGCPs=100, tolerance=None):
         ''' Create list of GCPs from given grids of latitude and longitude
 
         take <numOfGCPs> regular pixels from inpt <lat> and <lon> grids
+        (and more pixels where lat/lon are not linear, if <tolerance> is
+        given)
         Create GCPs from these pixels
         Create latlong GCPs projection
 
@@ -1281,6 +2099,10 @@ class VRT():
             array of longitudes (should be the same size as lat)
         numOfGCPs : int, optional, default = 100
             number of GCPs to create
+        tolerance : float, optional, default = None
+            if given, GCPs are added to cells of the regular grid where
+            lat/lon deviate from bilinear by more than tolerance (degrees)
+            (see nansat_tools.refine_gcp_indices())
 
         Returns
         --------
@@ -1294,24 +2116,21 @@ class VRT():
         self.logger.debug('gcpCount: %d %d %f %d %d',
                           lat.shape[0], lat.shape[1], gcpSize, step0, step1)
 
-        # generate list of GCPs
-        gcps = []
-        k = 0
-        for i0 in range(0, lat.shape[0], step0):
-            for i1 in range(0, lat.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                gcp = gdal.GCP(float(lon[i0, i1]),
-                               float(lat[i0, i1]),
-                               0, i1, i0)
-                self.logger.debug('%d %d %d %f %f',
-                                  k, gcp.GCPPixel, gcp.GCPLine,
-                                  gcp.GCPX, gcp.GCPY)
-                gcps.append(gcp)
-                k += 1
+        # select pixels of GCPs and generate list of GCPs
+        rows = np.arange(0, lat.shape[0], step0)
+        cols = np.arange(0, lat.shape[1], step1)
+        if tolerance is None:
+            colIndices, rowIndices = np.meshgrid(cols, rows)
+        else:
+            rowIndices, colIndices = refine_gcp_indices(lat, lon, rows, cols,
+                                                        tolerance)
+        gcps = latlon2gcps(lat, lon, rowIndices, colIndices)
+        self.logger.debug('Number of GCPs: %d', len(gcps))
 
         return gcps
 
-    def convert_GeolocationArray2GPCs(self, stepX=1, stepY=1):
+    def convert_GeolocationArray2GPCs(self, stepX=1, stepY=1,
+                                      tolerance=None):
         ''' Converting geolocation arrays to GCPs, and deleting the former
 
         When the geolocation arrays are much smaller than the raster bands,
@@ -1328,6 +2147,10 @@ class VRT():
             dramatically when using -tps (switch to gdalwarp).
             stepX and stepY can be adjusted to reduce density of GCPs
             (always keeping the ones around boundaries)
+        tolerance : float, optional (default None)
+            if given, GCPs are added where lat/lon deviate from bilinear
+            by more than tolerance (degrees)
+            (see nansat_tools.refine_gcp_indices())
 
         Modifies
         ---------
@@ -1343,24 +2166,182 @@ class VRT():
         PIXEL_STEP = int(geolocArray['PIXEL_STEP'])
         LINE_OFFSET = int(geolocArray['LINE_OFFSET'])
         LINE_STEP = int(geolocArray['LINE_STEP'])
-        pixels = np.linspace(PIXEL_OFFSET, PIXEL_OFFSET + (numx - 1) *
-                             PIXEL_STEP, numx)
-        lines = np.linspace(LINE_OFFSET, LINE_OFFSET + (numy - 1) *
-                            LINE_STEP, numy)
-        # Make GCPs
-        GCPs = []
         # Subsample (if requested), but use linspace to
         # make sure endpoints are ntained
-        for p in np.around(np.linspace(0, len(pixels) - 1, numx / stepX)):
-            for l in np.around(np.linspace(0, len(lines) - 1, numy / stepY)):
-                g = gdal.GCP(float(x[l, p]), float(y[l, p]), 0,
-                             pixels[p], lines[l])
-                GCPs.append(g)
+        cols = np.around(np.linspace(0, numx - 1, numx / stepX)).astype(int)
+        rows = np.around(np.linspace(0, numy - 1, numy / stepY)).astype(int)
+        if tolerance is None:
+            colIndices, rowIndices = np.meshgrid(cols, rows)
+        else:
+            rowIndices, colIndices = refine_gcp_indices(y, x, rows, cols,
+                                                        tolerance)
+        # Make GCPs
+        GCPs = latlon2gcps(y, x, rowIndices, colIndices,
+                           lineStep=LINE_STEP, pixelStep=PIXEL_STEP,
+                           lineOffset=LINE_OFFSET, pixelOffset=PIXEL_OFFSET)
         # Insert GCPs
         self.dataset.SetGCPs(GCPs, geolocArray['SRS'])
         # Delete geolocation array
         self.add_geolocationArray()
 
+    def get_derived_bands(self, bandNumbers):
+        ''' Get pixel functions and sources of derived bands
+
+        Parameters
+        -----------
+        bandNumbers : list of int
+            numbers of bands to check
+
+        Returns
+        --------
+        derivedBands : dict
+            key = number of band (only VRTDerivedRasterBand bands),
+            value = (PixelFunctionType, GDAL data type of the band,
+                     SourceTransferType ('' if not given),
+                     list with (XML, native GDAL data type) of each source)
+            bands without sources are not included
+
+        '''
+        derivedBands = {}
+        node0 = self.read_xml_node()
+        for bandNode in node0.nodeList('VRTRasterBand'):
+            bandNumber = int(bandNode.getAttribute('band'))
+            if (bandNumber not in bandNumbers or
+                    bandNode.attributes.get('subClass') !=
+                    'VRTDerivedRasterBand'):
+                continue
+            dataType = str(bandNode.getAttribute('dataType'))
+            sourceTransferType = ''
+            if bandNode.node('SourceTransferType'):
+                sourceTransferType = str(bandNode['SourceTransferType'])
+            srcs = [(str(srcNode.rawxml()),
+                     self._get_source_data_type(srcNode))
+                    for srcNode in bandNode.children
+                    if srcNode.tag in ['SimpleSource', 'ComplexSource',
+                                       'AveragedSource']]
+            if len(srcs) == 0:
+                continue
+            derivedBands[bandNumber] = (str(bandNode['PixelFunctionType']),
+                                        gdal.GetDataTypeByName(dataType),
+                                        sourceTransferType,
+                                        srcs)
+
+        return derivedBands
+
+    def _get_source_data_type(self, srcNode):
+        ''' Get native data type of a source of a VRT band
+
+        Data type of the source band is used. If values of a ComplexSource
+        are scaled or passed through LUT, it is combined with Float32.
+
+        Parameters
+        -----------
+        srcNode : Node
+            node with XML of the source
+
+        Returns
+        --------
+        dataType : int
+            GDAL data type
+
+        '''
+        try:
+            srcDataset = gdal.Open(str(srcNode['SourceFilename']))
+            dataType = srcDataset.GetRasterBand(
+                                int(srcNode['SourceBand'])).DataType
+        except:
+            self.logger.warning('Cannot get data type of source %s'
+                                % srcNode.rawxml())
+            return gdal.GDT_Float64
+
+        if srcNode.tag == 'ComplexSource':
+            scaleRatio = srcNode.node('ScaleRatio')
+            scaleOffset = srcNode.node('ScaleOffset')
+            lut = srcNode.node('LUT')
+            if ((scaleRatio and scaleRatio.value and
+                    float(scaleRatio.value) != 1.0) or
+                    (scaleOffset and scaleOffset.value and
+                     float(scaleOffset.value) != 0.0) or
+                    (lut and lut.value)):
+                dataType = gdal.DataTypeUnion(dataType, gdal.GDT_Float32)
+
+        return dataType
+
+    def create_source_vrt(self, srcXML, dataType):
+        ''' Create VRT with one band reading the given source
+
+        Parameters
+        -----------
+        srcXML : str
+            XML of the source (e.g. from get_derived_bands())
+        dataType : int
+            GDAL data type of the band (native type of the source)
+
+        Returns
+        --------
+        srcVRT : VRT
+            VRT with the same size as self and one band
+
+        '''
+        srcVRT = VRT(srcRasterXSize=self.dataset.RasterXSize,
+                     srcRasterYSize=self.dataset.RasterYSize)
+        srcVRT.dataset.AddBand(dataType)
+        srcVRT.dataset.GetRasterBand(1).SetMetadataItem('source_0', srcXML,
+                                                        'new_vrt_sources')
+        srcVRT.dataset.FlushCache()
+
+        return srcVRT
+
+    def create_derived_vrt(self, derivedBands, arrayVRTs):
+        ''' Create VRT with derived bands computed from arrays
+
+        Parameters
+        -----------
+        derivedBands : list
+            elements are (PixelFunctionType, GDAL data type of the band,
+            SourceTransferType ('' if not given),
+            list of keys of arrayVRTs with sources of the band)
+        arrayVRTs : dict
+            VRTs created from arrays with data of the sources
+
+        Returns
+        --------
+        derivedVRT : VRT
+            VRT with one band for each element of derivedBands
+
+        '''
+        arrayVRT = arrayVRTs.values()[0]
+        xSize = arrayVRT.dataset.RasterXSize
+        ySize = arrayVRT.dataset.RasterYSize
+        derivedVRT = VRT(srcRasterXSize=xSize, srcRasterYSize=ySize)
+        for (pixelFunctionType, dataType, sourceTransferType,
+                srcKeys) in derivedBands:
+            options = ['subClass=VRTDerivedRasterBand',
+                       'PixelFunctionType=%s' % pixelFunctionType]
+            if sourceTransferType != '':
+                options.append('SourceTransferType=%s' % sourceTransferType)
+            derivedVRT.dataset.AddBand(dataType, options=options)
+            metadataSRC = {}
+            for i, srcKey in enumerate(srcKeys):
+                metadataSRC['source_%d' % i] = self.ComplexSource.substitute(
+                                    Dataset=arrayVRTs[srcKey].fileName,
+                                    SourceBand=1,
+                                    SourceType='ComplexSource',
+                                    NODATA='',
+                                    ScaleOffset=0.0,
+                                    ScaleRatio=1.0,
+                                    LUT='',
+                                    srcXSize=xSize,
+                                    srcYSize=ySize,
+                                    dstXSize=xSize,
+                                    dstYSize=ySize)
+            derivedVRT.dataset.GetRasterBand(
+                derivedVRT.dataset.RasterCount).SetMetadata(metadataSRC,
+                                                            'vrt_sources')
+        derivedVRT.dataset.FlushCache()
+
+        return derivedVRT
+
     def copyproj(self, fileName):
         ''' Copy geoloctation data from given VRT to a figure file
 
@@ -0,0 +1,361 @@
+# Name:    warpindex.py
+# Purpose: Container of WarpIndex class
+# Authors:      Asuka Yamakawa, Anton Korosov, Knut-Frode Dagestad,
+#               Morten W. Hansen, Alexander Myasoyedov,
+#               Dmitry Petrenko, Evgeny Morozov
+# Created:      29.06.2011
+# Copyright:    (c) NERSC 2011 - 2013
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+
+# import standard and additional libraries
+from nansat_tools import *
+from vrt import VRT
+
+
+class WarpIndex(object):
+    '''Precomputed index of source pixel/line for each destination pixel
+
+    The geo-reference of the source (geolocation array, GCPs or
+    GeoTransform) is solved only once: for each pixel of the destination
+    Domain the GDAL transformer gives pixel/line in the source image. The
+    index is then used for resampling of any number of bands (and of other
+    images with the same geometry) with NumPy, without GDAL warping.
+
+    The index can be saved to a file (save()) and loaded again
+    (WarpIndex(fileName=...)), e.g. for the next image from the same
+    orbit track.
+
+    Example
+    -------
+    n.reproject(d, warpIndex=True) # computes index and keeps in d.warpIndex
+    d.warpIndex.save('track_123.npz')
+    n2.reproject(d, warpIndex=WarpIndex(fileName='track_123.npz'))
+
+    '''
+    def __init__(self, srcVRT=None, dstDomain=None, fileName=None,
+                 tps=False, logLevel=None):
+        '''Compute index from source VRT and destination Domain or load
+
+        Parameters
+        -----------
+        srcVRT : VRT
+            source VRT with geo-reference (e.g. Nansat.raw)
+        dstDomain : Domain
+            destination Domain
+        fileName : str
+            name of the file with index saved by save()
+        tps : bool
+            use thin plate splines for GCPs (instead of polynomial)
+        logLevel : int
+            level of logging
+
+        Creates
+        --------
+        self.pixel, self.line : 2D numpy arrays (float32)
+            pixel/line in the source image for each destination pixel
+            (NaN if cannot be calculated)
+        self.srcShape, self.dstShape : tuples
+            shapes of source and destination images
+        self.srcKey : str
+            hash of geo-reference of the source image
+
+        '''
+        self.logger = add_logger('Nansat', logLevel)
+        self.nearest = None
+        self.bilinear = None
+
+        if fileName is not None:
+            self.load(fileName)
+        elif srcVRT is not None and dstDomain is not None:
+            self._compute(srcVRT, dstDomain, tps)
+        else:
+            raise OptionError('Either fileName or srcVRT and dstDomain '
+                              'are required.')
+
+    def _compute(self, srcVRT, dstDomain, tps):
+        '''Calculate source pixel/line for each destination pixel
+
+        Parameters
+        -----------
+        srcVRT, dstDomain, tps : see __init__()
+
+        Modifies
+        ---------
+        self.pixel, self.line, self.srcShape, self.dstShape, self.srcKey
+
+        '''
+        # select geo-reference of the source as in VRT.create_warped_vrt()
+        options = []
+        if len(srcVRT.geolocationArray.d) > 0:
+            options.append('METHOD=GEOLOC_ARRAY')
+        elif len(srcVRT.dataset.GetGCPs()) > 0:
+            if tps:
+                options.append('METHOD=GCP_TPS')
+            else:
+                options.append('METHOD=GCP_POLYNOMIAL')
+
+        # transformer from source to destination pixel/line
+        transformer = gdal.Transformer(srcVRT.dataset,
+                                       dstDomain.vrt.dataset, options)
+
+        self.srcShape = (srcVRT.dataset.RasterYSize,
+                         srcVRT.dataset.RasterXSize)
+        self.dstShape = dstDomain.shape()
+        self.srcKey = self.get_source_key(srcVRT)
+        self.pixel = np.zeros(self.dstShape, 'float32') + np.nan
+        self.line = np.zeros(self.dstShape, 'float32') + np.nan
+
+        # transform centers of destination pixels in large batches of rows
+        self.logger.debug('Computing warp index %s => %s'
+                          % (str(self.srcShape), str(self.dstShape)))
+        batchRows = max(1, 1000000 / self.dstShape[1])
+        for row in range(0, self.dstShape[0], batchRows):
+            cols, rows = np.meshgrid(np.arange(self.dstShape[1]) + 0.5,
+                                     np.arange(row, min(row + batchRows,
+                                                        self.dstShape[0])) +
+                                     0.5)
+            points = np.column_stack([cols.ravel(), rows.ravel()]).tolist()
+            points, success = transformer.TransformPoints(1, points)
+            points = np.array(points).reshape(cols.shape + (-1, ))
+            success = np.array(success, 'bool').reshape(cols.shape)
+            pixel = self.pixel[row:row + cols.shape[0]]
+            line = self.line[row:row + cols.shape[0]]
+            pixel[success] = points[:, :, 0][success]
+            line[success] = points[:, :, 1][success]
+
+    @staticmethod
+    def get_source_key(srcVRT):
+        '''Get hash of geo-reference of the source VRT
+
+        Parameters
+        -----------
+        srcVRT : VRT
+
+        Returns
+        --------
+        srcKey : str
+            MD5 hash of size, GeoTransform, projection, GCPs and geolocation
+            array (content, see GeolocationArray.get_key()) of the source
+
+        '''
+        gcps = [(gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY, gcp.GCPZ)
+                for gcp in srcVRT.dataset.GetGCPs()]
+        keyList = [srcVRT.dataset.RasterXSize, srcVRT.dataset.RasterYSize,
+                   srcVRT.dataset.GetGeoTransform(),
+                   srcVRT.dataset.GetProjection(),
+                   gcps, srcVRT.dataset.GetGCPProjection(),
+                   srcVRT.geolocationArray.get_key()]
+
+        return hashlib.md5(repr(keyList)).hexdigest()
+
+    def fits(self, srcVRT, dstDomain, sameGeoreference=True):
+        '''Check if the index can be used for warping srcVRT onto dstDomain
+
+        Parameters
+        -----------
+        srcVRT : VRT
+        dstDomain : Domain
+        sameGeoreference : bool
+            if True, geo-reference of srcVRT should be the same as of the
+            source used for computing the index, otherwise only shapes are
+            compared
+
+        Returns
+        --------
+        True if the index fits
+
+        '''
+        if (self.srcShape != (srcVRT.dataset.RasterYSize,
+                              srcVRT.dataset.RasterXSize) or
+                self.dstShape != dstDomain.shape()):
+            return False
+        if sameGeoreference and self.srcKey != self.get_source_key(srcVRT):
+            return False
+
+        return True
+
+    def save(self, fileName):
+        '''Save index into a numpy (.npz) file
+
+        Parameters
+        -----------
+        fileName : str
+            name of the output file
+
+        '''
+        np.savez(fileName, pixel=self.pixel, line=self.line,
+                 srcShape=self.srcShape, dstShape=self.dstShape,
+                 srcKey=self.srcKey)
+
+    def load(self, fileName):
+        '''Load index from a numpy (.npz) file saved by save()
+
+        Parameters
+        -----------
+        fileName : str
+            name of the input file
+
+        Modifies
+        ---------
+        self.pixel, self.line, self.srcShape, self.dstShape, self.srcKey
+
+        '''
+        npzFile = np.load(fileName)
+        self.pixel = npzFile['pixel']
+        self.line = npzFile['line']
+        self.srcShape = tuple(npzFile['srcShape'].tolist())
+        self.dstShape = tuple(npzFile['dstShape'].tolist())
+        self.srcKey = str(npzFile['srcKey'])
+        self.nearest = None
+        self.bilinear = None
+
+    def _get_nearest(self):
+        '''Get (and keep) indices of nearest source pixels'''
+        if self.nearest is None:
+            valid = (np.isfinite(self.pixel) * np.isfinite(self.line) *
+                     (self.pixel >= 0) * (self.pixel < self.srcShape[1]) *
+                     (self.line >= 0) * (self.line < self.srcShape[0]))
+            cols = np.floor(self.pixel[valid]).astype('int32')
+            rows = np.floor(self.line[valid]).astype('int32')
+            self.nearest = valid, rows, cols
+
+        return self.nearest
+
+    def _get_bilinear(self):
+        '''Get (and keep) indices and weights of four source pixels'''
+        if self.bilinear is None:
+            valid, rows, cols = self._get_nearest()
+            # coordinates relative to centers of source pixels
+            x = np.clip(self.pixel[valid] - 0.5, 0, self.srcShape[1] - 1)
+            y = np.clip(self.line[valid] - 0.5, 0, self.srcShape[0] - 1)
+            cols0 = np.floor(x).astype('int32')
+            rows0 = np.floor(y).astype('int32')
+            cols1 = np.minimum(cols0 + 1, self.srcShape[1] - 1)
+            rows1 = np.minimum(rows0 + 1, self.srcShape[0] - 1)
+            dx = (x - cols0).astype('float32')
+            dy = (y - rows0).astype('float32')
+            self.bilinear = (valid,
+                             [(rows0, cols0, (1 - dx) * (1 - dy)),
+                              (rows0, cols1, dx * (1 - dy)),
+                              (rows1, cols0, (1 - dx) * dy),
+                              (rows1, cols1, dx * dy)])
+
+        return self.bilinear
+
+    def warp(self, array, eResampleAlg=0):
+        '''Resample source array onto the destination grid
+
+        Parameters
+        -----------
+        array : 2D numpy array
+            source data (with shape self.srcShape)
+        eResampleAlg : int
+            0 : nearest neighbour, other : bilinear
+
+        Returns
+        --------
+        warped : 2D numpy array
+            data on the destination grid. Pixels outside the source are
+            0 for nearest neighbour and NaN for bilinear
+
+        '''
+        if array.shape != self.srcShape:
+            raise OptionError('Shape of array %s does not fit the index %s'
+                              % (str(array.shape), str(self.srcShape)))
+
+        if eResampleAlg == 0:
+            valid, rows, cols = self._get_nearest()
+            warped = np.zeros(self.dstShape, array.dtype)
+            warped[valid] = array[rows, cols]
+        else:
+            valid, neighbours = self._get_bilinear()
+            warped = np.zeros(self.dstShape,
+                              np.result_type(array.dtype, 'float32'))
+            warped[:] = np.nan
+            values = 0
+            for rows, cols, weights in neighbours:
+                values = values + array[rows, cols] * weights
+            warped[valid] = values
+
+        return warped
+
+    def warp_vrt(self, srcVRT, dstDomain, eResampleAlg=0):
+        '''Create VRT with bands of source VRT resampled on demand
+
+        Bands are created without data. Each band is resampled only when
+        it is read for the first time (see VRT.load_lazy_bands()), so
+        bands which are not used are not read at all.
+
+        Parameters
+        -----------
+        srcVRT : VRT
+            source VRT (e.g. Nansat.raw)
+        dstDomain : Domain
+            destination Domain (shape should fit the index)
+        eResampleAlg : int
+            0 : nearest neighbour, other : bilinear
+
+        Returns
+        --------
+        warpedVRT : VRT
+            VRT with geo-reference of dstDomain and bands to be resampled.
+            Functions resampling the bands are kept in warpedVRT.lazyBands,
+            VRTs with data of resampled bands in warpedVRT.bandVRTs.
+            warpedVRT.gcpReport is None (GCPs are not thinned, see
+            VRT.thin_gcps())
+
+        '''
+        # GDAL data types of bilinear resampling (see warp())
+        bilinearTypes = {gdal.GDT_Int32: gdal.GDT_Float64,
+                         gdal.GDT_UInt32: gdal.GDT_Float64,
+                         gdal.GDT_Float64: gdal.GDT_Float64,
+                         gdal.GDT_CInt16: gdal.GDT_CFloat32,
+                         gdal.GDT_CFloat32: gdal.GDT_CFloat32,
+                         gdal.GDT_CInt32: gdal.GDT_CFloat64,
+                         gdal.GDT_CFloat64: gdal.GDT_CFloat64}
+
+        warpedVRT = VRT(gdalDataset=dstDomain.vrt.dataset,
+                        geolocationArray=dstDomain.vrt.geolocationArray)
+        warpedVRT.bandVRTs = []
+        warpedVRT.lazyBands = {}
+        warpedVRT.gcpReport = None
+        for iBand in range(srcVRT.dataset.RasterCount):
+            band = srcVRT.dataset.GetRasterBand(iBand + 1)
+            bandMetadata = band.GetMetadata()
+            # data type and pixel function are not inherited
+            for key in ['dataType', 'PixelFunctionType']:
+                bandMetadata.pop(key, None)
+            if eResampleAlg == 0:
+                dataType = band.DataType
+            else:
+                dataType = bilinearTypes.get(band.DataType, gdal.GDT_Float32)
+
+            # add band without sources, data is added on demand
+            warpedVRT.dataset.AddBand(dataType)
+            warpedVRT._put_metadata(warpedVRT.dataset.GetRasterBand(
+                                    warpedVRT.dataset.RasterCount),
+                                    bandMetadata)
+            warpedVRT.lazyBands[iBand + 1] = self._get_band_warper(
+                                                srcVRT, iBand + 1,
+                                                eResampleAlg)
+        warpedVRT._reset_bands_index()
+        warpedVRT.dataset.FlushCache()
+
+        return warpedVRT
+
+    def _get_band_warper(self, srcVRT, bandNumber, eResampleAlg):
+        '''Get function which reads and resamples one band of srcVRT'''
+        def warp_band():
+            self.logger.debug('Warping band %d' % bandNumber)
+            band = srcVRT.dataset.GetRasterBand(bandNumber)
+            return self.warp(band.ReadAsArray(), eResampleAlg)
+
+        return warp_band